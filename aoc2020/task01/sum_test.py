@@ -0,0 +1,87 @@
+import itertools
+import os
+import random
+import tempfile
+import unittest
+from array import array
+from unittest import mock
+
+from aoc2020.task01 import task01
+from aoc2020.task01.task01 import find_pair, find_triplet, find_k_sum, find_pairs_for_targets, \
+    load, load_compact, CACHE_SUFFIX, STRATEGY_NAIVE, STRATEGY_HASH, STRATEGY_TWO_POINTER, STRATEGY_K_SUM
+
+
+class SumTest(unittest.TestCase):
+
+    EXPENSES = [1721, 979, 366, 299, 675, 1456]
+
+    def test_find_pair(self):
+        for strategy in [STRATEGY_NAIVE, STRATEGY_HASH, STRATEGY_TWO_POINTER, STRATEGY_K_SUM]:
+            pair = find_pair(SumTest.EXPENSES, strategy=strategy)
+            self.assertEqual({1721, 299}, set(pair))
+        self.assertIsNone(find_pair(SumTest.EXPENSES, 1))
+
+    def test_find_triplet(self):
+        for strategy in [STRATEGY_NAIVE, STRATEGY_TWO_POINTER, STRATEGY_K_SUM]:
+            triplet = find_triplet(SumTest.EXPENSES, strategy=strategy)
+            self.assertEqual({979, 366, 675}, set(triplet))
+        self.assertIsNone(find_triplet(SumTest.EXPENSES, 1))
+
+    def test_find_k_sum(self):
+        # compare against brute force, duplicates and negative values included
+        rnd = random.Random(2020)
+        for _ in range(500):
+            values = [rnd.randint(-5, 8) for _ in range(rnd.randint(0, 9))]
+            k = rnd.randint(1, 6)
+            target = rnd.randint(-10, 25)
+            expected = {c for c in itertools.combinations(sorted(values), k) if sum(c) == target}
+            found = list(find_k_sum(values, k, target))
+            self.assertEqual(len(found), len(set(found)))
+            self.assertEqual(expected, set(found))
+            # the depth first search used when the lower halves don't fit the memory
+            with mock.patch.object(task01, "LOWER_HALF_LIMIT", 0):
+                found = list(find_k_sum(values, k, target))
+            self.assertEqual(len(found), len(set(found)))
+            self.assertEqual(expected, set(found))
+            first = list(find_k_sum(values, k, target, first_only=True))
+            self.assertEqual(1 if expected else 0, len(first))
+            self.assertTrue(set(first) <= expected)
+        # a bad k fails right away, not on the first next()
+        self.assertRaises(ValueError, find_k_sum, [1, 2], 0)
+
+    def test_find_pairs_for_targets(self):
+        targets = [2020, 1, 2 * 1721, 979 + 366]
+        expected = [(299, 1721), None, None, (366, 979)]
+        self.assertEqual(expected, find_pairs_for_targets(SumTest.EXPENSES, targets))
+        # the pure python fallback has to agree with whichever backend is in use
+        self.assertEqual(expected, task01._find_pairs_for_targets_python(SumTest.EXPENSES, targets))
+
+    def test_load_compact(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            input_path = os.path.join(tmp_dir, "input.txt")
+            with open(input_path, 'w') as input_file:
+                input_file.write("\n".join(str(v) for v in SumTest.EXPENSES) + "\n")
+
+            parsed = load_compact(input_path)
+            self.assertTrue(os.path.exists(input_path + CACHE_SUFFIX))
+            mapped = load_compact(input_path)
+            self.assertIsInstance(mapped, memoryview)
+            self.assertEqual(load(input_path), list(parsed))
+            self.assertEqual(load(input_path), list(mapped))
+            self.assertEqual({1721, 299}, set(find_pair(mapped)))
+            self.assertEqual({979, 366, 675}, set(find_triplet(mapped)))
+            # without numpy the sorted copy has to stay compact as well, even when sorted in several runs
+            with mock.patch.object(task01, "numpy", None), mock.patch.object(task01, "SORT_CHUNK", 4):
+                sorted_copy = task01._sorted_copy(mapped)
+                self.assertIsInstance(sorted_copy, array)
+                self.assertEqual(sorted(SumTest.EXPENSES), list(sorted_copy))
+                self.assertEqual({1721, 299}, set(find_pair(mapped)))
+                self.assertEqual({979, 366, 675}, set(find_triplet(mapped)))
+            mapped.release()
+
+    def test_unknown_strategy(self):
+        self.assertRaises(ValueError, find_pair, SumTest.EXPENSES, 2020, "bogus")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,33 @@
+import argparse
+import heapq
 import math
-from typing import Tuple
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from itertools import islice
+from typing import Tuple, Sequence, Iterable, Iterator, Dict, List, Callable
+
+try:
+    import numpy
+except ImportError:
+    # numpy is optional - batch searches fall back to pure python
+    numpy = None
 
 
 DEBUG = False
 TARGET = 2020
+# compact ledgers are cached next to the text file, the header remembers which version of the text file it came from
+CACHE_SUFFIX = ".q64"
+CACHE_MAGIC = b"AOCQ64" + (b"LE" if sys.byteorder == "little" else b"BE")
+CACHE_HEADER = struct.Struct("=8sqq")
+LOAD_CHUNK_BYTES = 1 << 20
+# most lower halves find_k_sum keeps in memory for the meet in the middle, beyond that it searches depth first
+LOWER_HALF_LIMIT = 1 << 20
+# number of values sorted as python ints at once when sorting a compact ledger without numpy
+SORT_CHUNK = 1 << 16
 
 
 def load(file_path: str) -> list:
@@ -15,8 +39,121 @@ def load(file_path: str) -> list:
     return ret_val
 
 
+def load_compact(file_path: str, use_cache: bool = True) -> Sequence[int]:
+    # Returns the ledger as 8-byte signed ints - either a read-only view of the mmapped cache or an array('q')
+    cache_path = file_path + CACHE_SUFFIX
+    if use_cache:
+        cached = _map_cache(file_path, cache_path)
+        if cached is not None:
+            log("Mapped %d values from %s" % (len(cached), cache_path))
+            return cached
+
+    ret_val = array('q')
+    with open(file_path, 'r') as input_file:
+        while True:
+            lines = input_file.readlines(LOAD_CHUNK_BYTES)
+            if not lines:
+                break
+            ret_val.extend(map(int, lines))
+    log("Loaded %d values" % len(ret_val))
+
+    if use_cache:
+        _write_cache(file_path, cache_path, ret_val)
+    return ret_val
+
+
+def _source_stamp(file_path: str) -> Tuple[int, int]:
+    stat = os.stat(file_path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _map_cache(file_path: str, cache_path: str) -> memoryview or None:
+    if not os.path.exists(cache_path):
+        return None
+    with open(cache_path, 'rb') as cache_file:
+        header = cache_file.read(CACHE_HEADER.size)
+        if len(header) != CACHE_HEADER.size:
+            return None
+        magic, size, mtime_ns = CACHE_HEADER.unpack(header)
+        if magic != CACHE_MAGIC or (size, mtime_ns) != _source_stamp(file_path):
+            log("Cache %s is stale" % cache_path)
+            return None
+        mapped = mmap.mmap(cache_file.fileno(), 0, access=mmap.ACCESS_READ)
+    # the view keeps the mapping alive for as long as anybody holds on to it
+    return memoryview(mapped)[CACHE_HEADER.size:].cast('q')
+
+
+def _write_cache(file_path: str, cache_path: str, values: array) -> None:
+    size, mtime_ns = _source_stamp(file_path)
+    tmp_path = cache_path + ".tmp"
+    with open(tmp_path, 'wb') as cache_file:
+        cache_file.write(CACHE_HEADER.pack(CACHE_MAGIC, size, mtime_ns))
+        values.tofile(cache_file)
+    os.replace(tmp_path, cache_path)
+
+
+def _is_int64_buffer(values) -> bool:
+    return (isinstance(values, array) and values.typecode == 'q') or \
+        (isinstance(values, memoryview) and values.format == 'q')
+
+
+def _as_int64_array(values: Iterable[int]):
+    if _is_int64_buffer(values):
+        # no copy, numpy reads the buffer in place
+        return numpy.frombuffer(values, dtype=numpy.int64)
+    return numpy.fromiter(values, dtype=numpy.int64)
+
+
+def _sorted_copy(values: Iterable[int]) -> Sequence[int]:
+    if _is_int64_buffer(values):
+        # keep compact ledgers compact - sort in numpy and hand back an array('q')
+        ret_val = array('q')
+        if numpy is not None:
+            ret_val.frombytes(numpy.sort(numpy.frombuffer(values, dtype=numpy.int64)).tobytes())
+        else:
+            # Sort runs of SORT_CHUNK values (only a single run is ever a list of boxed ints) and merge them -
+            # the peak stays at about twice the size of the compact ledger
+            runs = [array('q', sorted(values[start:start + SORT_CHUNK])) for start in range(0, len(values), SORT_CHUNK)]
+            ret_val.extend(heapq.merge(*runs))
+        return ret_val
+    return sorted(values)
+
+
+STRATEGY_NAIVE = "naive"
+STRATEGY_HASH = "hash"
+STRATEGY_TWO_POINTER = "two_pointer"
+STRATEGY_K_SUM = "k_sum"
+
+
 def find_pair(
-        input_list: list,
+        input_list: Sequence[int],
+        target: int = TARGET,
+        strategy: str or None = None
+) -> Tuple[int, int] or None:
+    if strategy is None:
+        # a set of a compact ledger would take several times the memory of the ledger itself
+        strategy = STRATEGY_TWO_POINTER if _is_int64_buffer(input_list) else STRATEGY_HASH
+    return _select(PAIR_STRATEGIES, strategy)(input_list, target)
+
+
+def find_triplet(
+        input_list: Sequence[int],
+        target: int = TARGET,
+        strategy: str = STRATEGY_TWO_POINTER
+) -> Tuple[int, int, int] or None:
+    return _select(TRIPLET_STRATEGIES, strategy)(input_list, target)
+
+
+def _select(strategies: Dict[str, Callable], strategy: str) -> Callable:
+    if strategy not in strategies:
+        raise ValueError(
+            "Unknown strategy '%s', expected one of: %s" % (strategy, ", ".join(strategies.keys()))
+        )
+    return strategies[strategy]
+
+
+def _find_pair_naive(
+        input_list: Sequence[int],
         target: int = TARGET
 ) -> Tuple[int, int] or None:
 
@@ -31,8 +168,8 @@ def find_pair(
     return None
 
 
-def find_triplet(
-        input_list: list,
+def _find_triplet_naive(
+        input_list: Sequence[int],
         target: int = TARGET
 ) -> Tuple[int, int, int] or None:
 
@@ -40,14 +177,352 @@ def find_triplet(
         candidate = input_list[0]
         input_list = input_list[1:]
         sub_target = target - candidate
-        pair = find_pair(input_list, sub_target)
+        pair = _find_pair_naive(input_list, sub_target)
         if pair is not None:
             return candidate, pair[0], pair[1]
     return None
 
 
-def main() -> None:
-    input_list = load("./input.txt")
+def _find_pair_hash(
+        input_list: Iterable[int],
+        target: int = TARGET
+) -> Tuple[int, int] or None:
+    # single pass - every value is checked against the values seen before it
+    seen = set()
+    for value in input_list:
+        complement = target - value
+        if complement in seen:
+            return complement, value
+        seen.add(value)
+    return None
+
+
+def _find_pair_two_pointer(
+        input_list: Iterable[int],
+        target: int = TARGET
+) -> Tuple[int, int] or None:
+    # sort once (compact ledgers stay compact) and sweep from both ends
+    values = _sorted_copy(input_list)
+    lo = 0
+    hi = len(values) - 1
+    while lo < hi:
+        total = values[lo] + values[hi]
+        if total == target:
+            return values[lo], values[hi]
+        if total < target:
+            lo += 1
+        else:
+            hi -= 1
+    return None
+
+
+def _find_triplet_two_pointer(
+        input_list: Iterable[int],
+        target: int = TARGET
+) -> Tuple[int, int, int] or None:
+    # sort once, then fix the smallest value and sweep the rest from both ends
+    values = _sorted_copy(input_list)
+    n = len(values)
+    log("Going to sweep through %d candidates" % n)
+    for i in range(n - 2):
+        candidate = values[i]
+        if candidate + values[i + 1] + values[i + 2] > target:
+            # even the smallest remaining values overshoot - no point in going further
+            break
+        if candidate + values[-2] + values[-1] < target:
+            continue
+        lo = i + 1
+        hi = n - 1
+        while lo < hi:
+            total = candidate + values[lo] + values[hi]
+            if total == target:
+                return candidate, values[lo], values[hi]
+            if total < target:
+                lo += 1
+            else:
+                hi -= 1
+    return None
+
+
+def find_k_sum(
+        values: Iterable[int],
+        k: int,
+        target: int = TARGET,
+        first_only: bool = False
+) -> Iterator[Tuple[int, ...]]:
+    # Streams every multiset of k values (respecting how many times a value occurs in the input) summing up to
+    # the target, each of them exactly once and sorted ascending. Not a generator itself, so that a bad k fails
+    # right away rather than on the first next().
+    if k < 1:
+        raise ValueError("At least one value has to be searched for, received k=%d" % k)
+    counts: Dict[int, int] = {}
+    for value in values:
+        counts[value] = counts.get(value, 0) + 1
+    space = _SearchSpace(counts, k)
+    if space.size < k:
+        return iter(())
+    if first_only:
+        return islice(_depth_first_k_sums(space, k, target), 1)
+    if math.comb(space.size, k // 2) > LOWER_HALF_LIMIT:
+        # the lower halves wouldn't fit the memory - streaming depth first needs none, at the price of more time
+        return _depth_first_k_sums(space, k, target)
+    return _all_k_sums(space, counts, k, target)
+
+
+def _all_k_sums(space: '_SearchSpace', counts: Dict[int, int], k: int, target: int) -> Iterator[Tuple[int, ...]]:
+    # Meet in the middle: every solution is split into its lower half of k // 2 values and its upper half of the
+    # remaining values. The upper halves are enumerated in the order of their smallest value, while all lower halves
+    # that can precede them sit in a map keyed by their sum.
+    lower_k = k // 2
+    upper_k = k - lower_k
+    min_lower = space.min_sum(0, lower_k)
+    max_upper = space.max_sum(space.n, upper_k)
+    # lower halves whose largest value is strictly smaller than the currently processed one
+    lower_map: Dict[int, List[Tuple[int, ...]]] = {0: [()]} if lower_k == 0 else {}
+
+    for j in range(space.n):
+        value = space.distinct[j]
+        min_upper = space.min_sum(j, upper_k)
+        if min_upper is None or min_lower + min_upper > target:
+            # the sums only grow from now on
+            break
+
+        # lower halves ending with the current value
+        ending_here: Dict[int, List[Tuple[int, ...]]] = {}
+        if lower_k > 0:
+            for total, combination in space.ending_with(j, lower_k, target - max_upper, target - min_upper):
+                ending_here.setdefault(total, []).append(combination)
+
+        # upper halves starting with the current value
+        max_lower = space.max_sum(j + 1, lower_k)
+        if max_lower is not None:
+            for total, upper in space.starting_with(j, upper_k, target - max_lower, target - min_lower):
+                needed = target - total
+                for lower in lower_map.get(needed, ()):
+                    yield lower + upper
+                upper_copies = _leading_copies(upper, value)
+                for lower in ending_here.get(needed, ()):
+                    if _trailing_copies(lower, value) + upper_copies <= counts[value]:
+                        yield lower + upper
+
+        for total, combinations in ending_here.items():
+            lower_map.setdefault(total, []).extend(combinations)
+
+
+def _depth_first_k_sums(space: '_SearchSpace', k: int, target: int) -> Iterator[Tuple[int, ...]]:
+    # Depth first over the k - 2 smallest values, closing each prefix with a 2-sum lookup in the distinct values -
+    # nothing gets stored, so the first solution comes without paying for the whole meet in the middle map
+    if k == 1:
+        if target in space.index:
+            yield target,
+        return
+    yield from _search_prefix(space, 0, 0, k, target)
+
+
+def _search_prefix(space: '_SearchSpace', j: int, taken: int, r: int, rest: int) -> Iterator[Tuple[int, ...]]:
+    # r values summing up to rest, picked from the distinct index j onwards, taken copies of which are used already
+    if r == 2:
+        yield from _search_pair(space, j, taken, rest)
+        return
+    max_rest = space.max_sum(space.n, r - 1)
+    # anything smaller than this can't reach the rest even with the largest values
+    first = max(j, bisect_left(space.distinct, rest - max_rest))
+    for i in range(first, space.n):
+        used = taken if i == j else 0
+        if space.copies[i] == used:
+            continue
+        start = space.run_start[i] + used
+        if start + r > space.size or space.prefix[start + r] - space.prefix[start] > rest:
+            # the sums only grow from now on
+            break
+        value = space.distinct[i]
+        for found in _search_prefix(space, i, used + 1, r - 1, rest - value):
+            yield (value,) + found
+
+
+def _search_pair(space: '_SearchSpace', j: int, taken: int, rest: int) -> Iterator[Tuple[int, int]]:
+    first = max(j, bisect_left(space.distinct, rest - space.distinct[-1]))
+    for i in range(first, space.n):
+        value = space.distinct[i]
+        complement = rest - value
+        if complement < value:
+            break
+        available = space.copies[i] - (taken if i == j else 0)
+        if complement == value:
+            if available >= 2:
+                yield value, value
+        elif available >= 1 and complement in space.index:
+            yield value, complement
+
+
+class _SearchSpace:
+    # Sorted distinct values along with their multiplicities, capped at k (we never need more copies than that).
+    # The prefix sums over the expanded values give us the tightest bounds on partial sums for pruning.
+
+    def __init__(self, counts: Dict[int, int], k: int):
+        self.distinct: List[int] = sorted(counts.keys())
+        self.index: Dict[int, int] = {value: j for j, value in enumerate(self.distinct)}
+        self.copies: List[int] = [min(counts[value], k) for value in self.distinct]
+        self.n = len(self.distinct)
+        self.run_start: List[int] = [0]
+        self.prefix: List[int] = [0]
+        for value, copies in zip(self.distinct, self.copies):
+            for _ in range(copies):
+                self.prefix.append(self.prefix[-1] + value)
+            self.run_start.append(self.run_start[-1] + copies)
+        self.size = self.run_start[-1]
+
+    def min_sum(self, j: int, r: int) -> int or None:
+        # the smallest sum of r values picked from the distinct index j onwards
+        start = self.run_start[j]
+        if start + r > self.size:
+            return None
+        return self.prefix[start + r] - self.prefix[start]
+
+    def max_sum(self, end: int, r: int) -> int or None:
+        # the largest sum of r values picked from below the distinct index end
+        stop = self.run_start[end]
+        if stop - r < 0:
+            return None
+        return self.prefix[stop] - self.prefix[stop - r]
+
+    def combinations(self, start: int, end: int, r: int, lo: int, hi: int) -> Iterator[Tuple[int, Tuple[int, ...]]]:
+        # ascending combinations of r values from the distinct indices [start, end) with their sum within [lo, hi]
+        if r == 0:
+            if lo <= 0 <= hi:
+                yield 0, ()
+            return
+        max_total = self.max_sum(end, r)
+        if max_total is None or max_total < lo:
+            return
+        for j in range(start, end):
+            min_total = self.min_sum(j, r)
+            if min_total is None or min_total > hi or self.run_start[j] + r > self.run_start[end]:
+                break
+            value = self.distinct[j]
+            for m in range(1, min(self.copies[j], r) + 1):
+                part = value * m
+                for total, rest in self.combinations(j + 1, end, r - m, lo - part, hi - part):
+                    yield part + total, (value,) * m + rest
+
+    def starting_with(self, j: int, r: int, lo: int, hi: int) -> Iterator[Tuple[int, Tuple[int, ...]]]:
+        value = self.distinct[j]
+        for m in range(1, min(self.copies[j], r) + 1):
+            part = value * m
+            for total, rest in self.combinations(j + 1, self.n, r - m, lo - part, hi - part):
+                yield part + total, (value,) * m + rest
+
+    def ending_with(self, j: int, r: int, lo: int, hi: int) -> Iterator[Tuple[int, Tuple[int, ...]]]:
+        value = self.distinct[j]
+        for m in range(1, min(self.copies[j], r) + 1):
+            part = value * m
+            for total, rest in self.combinations(0, j, r - m, lo - part, hi - part):
+                yield part + total, rest + (value,) * m
+
+
+def _leading_copies(combination: Tuple[int, ...], value: int) -> int:
+    n = 0
+    while n < len(combination) and combination[n] == value:
+        n += 1
+    return n
+
+
+def _trailing_copies(combination: Tuple[int, ...], value: int) -> int:
+    n = 0
+    while n < len(combination) and combination[-1 - n] == value:
+        n += 1
+    return n
+
+
+def find_pairs_for_targets(
+        input_list: Iterable[int],
+        targets: Iterable[int]
+) -> List[Tuple[int, int] or None]:
+    if numpy is not None:
+        return _find_pairs_for_targets_numpy(input_list, targets)
+    return _find_pairs_for_targets_python(input_list, targets)
+
+
+def _find_pairs_for_targets_numpy(
+        input_list: Iterable[int],
+        targets: Iterable[int]
+) -> List[Tuple[int, int] or None]:
+    values = numpy.sort(_as_int64_array(input_list))
+    targets = _as_int64_array(targets)
+    ret_val: List[Tuple[int, int] or None] = [None] * len(targets)
+    n = len(values)
+    if n < 2:
+        return ret_val
+    log("Going to answer %d targets" % len(targets))
+    # the smaller value of a pair can't be more than half of the target
+    halves = numpy.searchsorted(values, targets // 2, side="right")
+    for row in numpy.flatnonzero(halves):
+        target = int(targets[row])
+        lows = values[:halves[row]]
+        complements = target - lows
+        found = numpy.searchsorted(values, complements, side="left")
+        numpy.minimum(found, n - 1, out=found)
+        hits = values[found] == complements
+        # a value can only pair with itself if there's another copy right after the first one
+        same = numpy.flatnonzero(hits & (complements == lows))
+        if len(same) > 0:
+            after = found[same] + 1
+            hits[same] = (after < n) & (values[numpy.minimum(after, n - 1)] == complements[same])
+        first = int(hits.argmax())
+        if hits[first]:
+            ret_val[row] = (int(lows[first]), int(complements[first]))
+    return ret_val
+
+
+def _find_pairs_for_targets_python(
+        input_list: Iterable[int],
+        targets: Iterable[int]
+) -> List[Tuple[int, int] or None]:
+    counts: Dict[int, int] = {}
+    for value in input_list:
+        counts[value] = counts.get(value, 0) + 1
+    distinct = sorted(counts.keys())
+    ret_val: List[Tuple[int, int] or None] = []
+    for target in targets:
+        pair = None
+        for value in distinct:
+            complement = target - value
+            if complement < value:
+                break
+            if complement in counts and (complement != value or counts[value] > 1):
+                pair = value, complement
+                break
+        ret_val.append(pair)
+    return ret_val
+
+
+PAIR_STRATEGIES: Dict[str, Callable[[Sequence[int], int], Tuple[int, int] or None]] = {
+    STRATEGY_HASH: _find_pair_hash,
+    STRATEGY_TWO_POINTER: _find_pair_two_pointer,
+    STRATEGY_NAIVE: _find_pair_naive,
+    STRATEGY_K_SUM: lambda input_list, target: next(find_k_sum(input_list, 2, target, first_only=True), None),
+}
+
+TRIPLET_STRATEGIES: Dict[str, Callable[[Sequence[int], int], Tuple[int, int, int] or None]] = {
+    STRATEGY_TWO_POINTER: _find_triplet_two_pointer,
+    STRATEGY_NAIVE: _find_triplet_naive,
+    STRATEGY_K_SUM: lambda input_list, target: next(find_k_sum(input_list, 3, target, first_only=True), None),
+}
+
+
+def main(argv: List[str] or None = None) -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input", default="./input.txt", help="the expense ledger, one value per line")
+    parser.add_argument("--targets", default=None, help="search pairs for every target listed in this file")
+    args = parser.parse_args(argv)
+
+    input_list = load_compact(args.input)
+
+    if args.targets is not None:
+        targets = load(args.targets)
+        for target, pair in zip(targets, find_pairs_for_targets(input_list, targets)):
+            print("%d: %s" % (target, str(pair)))
+        return
 
     t = find_pair(input_list)
     print("Found: %s" % str(t))
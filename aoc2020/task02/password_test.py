@@ -0,0 +1,109 @@
+import os
+import random
+import tempfile
+import unittest
+
+from aoc2020.task02.task02 import load, load_columns, validate_columns, validate_occurrences, validate_positions, \
+    validate_parallel, split_ranges, StreamValidator, PARSER_REGEX, PARSER_FAST
+
+
+class PasswordTest(unittest.TestCase):
+
+    ENTRIES = "1-3 a: abcde\n1-3 b: cdefg\n2-9 c: ccccccccc\n"
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _write(self, content: str, name: str = "input.txt") -> str:
+        path = os.path.join(self.tmp_dir.name, name)
+        with open(path, 'w', newline="") as f:
+            f.write(content)
+        return path
+
+    def _load(self, path: str, parser: str):
+        try:
+            return [(rule.min, rule.max, rule.char, phrase) for rule, phrase in load(path, parser)]
+        except ValueError as e:
+            return str(e)
+
+    def test_counts(self):
+        path = self._write(PasswordTest.ENTRIES)
+        entries = load(path)
+        expected = (validate_occurrences(entries), validate_positions(entries))
+        self.assertEqual((2, 1), expected)
+        for parser in [PARSER_REGEX, PARSER_FAST]:
+            self.assertEqual(expected, validate_columns(load_columns(path, parser=parser)))
+            self.assertEqual(expected, validate_columns(load_columns(path, 8, parser=parser)))
+            self.assertEqual(expected, validate_parallel(path, 2, parser))
+
+        # windows line endings
+        path = self._write(PasswordTest.ENTRIES.replace("\n", "\r\n"), "crlf.txt")
+        self.assertEqual(expected, (validate_occurrences(load(path)), validate_positions(load(path))))
+        for parser in [PARSER_REGEX, PARSER_FAST]:
+            self.assertEqual(expected, validate_columns(load_columns(path, parser=parser)))
+            self.assertEqual(expected, validate_parallel(path, 2, parser))
+
+    def test_split_ranges(self):
+        path = self._write(PasswordTest.ENTRIES * 10)
+        for parts in [1, 2, 3, 7, 100, 10000]:
+            ranges = split_ranges(path, parts)
+            self.assertEqual(0, ranges[0][0])
+            self.assertEqual(os.path.getsize(path), ranges[-1][1])
+            for (_, end), (start, _) in zip(ranges, ranges[1:]):
+                self.assertEqual(end, start)
+
+        # more parts than there are bytes in the file
+        path = self._write(PasswordTest.ENTRIES.splitlines(keepends=True)[0], "one_line.txt")
+        self.assertEqual([(0, os.path.getsize(path))], split_ranges(path, 100))
+        self.assertEqual((1, 1), validate_parallel(path, 8))
+
+    def test_stream_validator(self):
+        lines = PasswordTest.ENTRIES.splitlines(keepends=True)
+        path = self._write(lines[0] + lines[1][:4])
+        state_path = os.path.join(self.tmp_dir.name, "state.json")
+
+        validator = StreamValidator()
+        self.assertEqual([(1, 1)], list(validator.follow(path)))
+        validator.save(state_path)
+
+        # finish the partial line and add one more, then resume from the saved state
+        self._write(lines[0] + lines[1] + lines[2])
+        validator = StreamValidator.restore(state_path)
+        self.assertEqual([(1, 1), (2, 1)], list(validator.follow(path)))
+        self.assertEqual(3, validator.entries)
+        self.assertEqual(os.path.getsize(path), validator.offset)
+
+        # a truncated file starts the count over
+        self._write(lines[2])
+        self.assertEqual([(1, 0)], list(validator.follow(path)))
+
+        # windows line endings, with both parsers
+        crlf_path = self._write(PasswordTest.ENTRIES.replace("\n", "\r\n"), "crlf.txt")
+        for parser in [PARSER_REGEX, PARSER_FAST]:
+            validator = StreamValidator(parser=parser)
+            self.assertEqual([(1, 1), (1, 1), (2, 1)], list(validator.follow(crlf_path)))
+            self.assertEqual(3, validator.entries)
+
+    def test_fuzz_parsers(self):
+        # both parsers have to accept the same lines and reject the same lines with the same message
+        rnd = random.Random(2)
+        pieces = ["1", "23", "-", " ", "\t", ":", "a", "Z", "bc", "x"]
+        for i in range(2000):
+            if i % 2:
+                line = "%d%s-%s%d%s%s:%s%s" % (
+                    rnd.randint(0, 30), rnd.choice(["", " "]), rnd.choice(["", " "]), rnd.randint(0, 30),
+                    rnd.choice(["", " ", "\t"]), rnd.choice("abZ"), rnd.choice(["", " "]),
+                    rnd.choice(["abc", "a", "zZ"])
+                )
+            else:
+                line = "".join(rnd.choice(pieces) for _ in range(rnd.randint(0, 10)))
+            content = PasswordTest.ENTRIES + line + rnd.choice(["", "\n", "\r\n"])
+            path = self._write(content)
+            self.assertEqual(self._load(path, PARSER_REGEX), self._load(path, PARSER_FAST), repr(content))
+
+
+if __name__ == '__main__':
+    unittest.main()
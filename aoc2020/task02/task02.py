@@ -1,7 +1,26 @@
+import argparse
+import io
+import json
+import os
 import re
-from typing import Tuple, List, Callable
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from itertools import accumulate, islice, repeat
+from typing import Tuple, List, Callable, Iterable, Iterator
 
 PATTERN = re.compile("^(\\d+)\\s*-\\s*(\\d+)\\s*([a-zA-Z]):\\s*([a-zA-Z]+)$")
+CHUNK_BYTES = 1 << 20
+PARSER_REGEX = "regex"
+PARSER_FAST = "fast"
+# what \\s matches within the ASCII range
+WHITESPACE = b" \t\n\r\x0b\x0c\x1c\x1d\x1e\x1f"
+SEPARATORS = bytes.maketrans(b"-:", b"  ")
+# The canonical "1-3 a: abcde" layout. When a whole block has it, the separators are exactly where split() finds them
+# and the block can be tokenized in bulk. Anything else goes through parse_line_fast line by line.
+CANONICAL_BLOCK = re.compile(b"(?:\\d+-\\d+ [a-zA-Z]: [a-zA-Z]+\\n)*(?:\\d+-\\d+ [a-zA-Z]: [a-zA-Z]+)?")
+# every worker gets a few byte ranges, so that a slow range doesn't leave the other workers idle
+RANGES_PER_WORKER = 4
 
 
 class Rule:
@@ -28,7 +47,68 @@ class Rule:
         return (lower_position and not upper_position) or (upper_position and not lower_position)
 
 
-def load(input_path: str) -> List[Tuple[Rule, str]]:
+class RuleColumns:
+    # A chunk of (rule, phrase) entries stored column by column - no per-line objects.
+    # The phrase of the i-th entry is phrases[offsets[i]:offsets[i + 1]].
+
+    def __init__(self):
+        self.mins = array('l')
+        self.maxs = array('l')
+        self.chars = bytearray()
+        self.offsets = array('q', [0])
+        self.phrases = bytearray()
+
+    def __len__(self) -> int:
+        return len(self.mins)
+
+    def append(self, min_occurrences: int, max_occurrences: int, char: int, phrase: bytes) -> None:
+        self.mins.append(min_occurrences)
+        self.maxs.append(max_occurrences)
+        self.chars.append(char)
+        self.phrases += phrase
+        self.offsets.append(len(self.phrases))
+
+    def extend(self, mins: Iterable[int], maxs: Iterable[int], chars: bytes, phrases: List[bytes]) -> None:
+        self.mins.extend(mins)
+        self.maxs.extend(maxs)
+        self.chars += chars
+        offsets = accumulate(map(len, phrases), initial=len(self.phrases))
+        # skip the initial offset, we already have that one
+        next(offsets)
+        self.offsets.extend(offsets)
+        self.phrases += b"".join(phrases)
+
+    def entries(self) -> Iterator[Tuple[Rule, str]]:
+        ends = islice(self.offsets, 1, None)
+        for lo, hi, char, start, end in zip(self.mins, self.maxs, self.chars, self.offsets, ends):
+            yield Rule(lo, hi, chr(char)), self.phrases[start:end].decode("ascii")
+
+    def count_valid(self) -> Tuple[int, int]:
+        # Both policies in one pass, same semantics as Rule.validate_occurrences/Rule.validate_positions
+        phrases = self.phrases
+        valid_occurrences = 0
+        valid_positions = 0
+        ends = islice(self.offsets, 1, None)
+        for lo, hi, char, start, end in zip(self.mins, self.maxs, self.chars, self.offsets, ends):
+            if lo <= phrases.count(char, start, end) <= hi:
+                valid_occurrences += 1
+            lower_idx = start + lo - 1
+            upper_idx = start + hi - 1
+            if (start <= lower_idx < end and phrases[lower_idx] == char) != \
+                    (start <= upper_idx < end and phrases[upper_idx] == char):
+                valid_positions += 1
+        return valid_occurrences, valid_positions
+
+
+def load(input_path: str, parser: str = PARSER_REGEX) -> List[Tuple[Rule, str]]:
+    if parser == PARSER_FAST:
+        ret_val = []
+        for columns in load_columns(input_path, parser=PARSER_FAST):
+            ret_val.extend(columns.entries())
+        return ret_val
+    if parser != PARSER_REGEX:
+        raise ValueError("Unknown parser '%s'" % parser)
+
     ret_val = []
     with open(input_path, 'r') as input_file:
         for line in input_file:
@@ -45,6 +125,270 @@ def load(input_path: str) -> List[Tuple[Rule, str]]:
     return ret_val
 
 
+def parse_line_fast(line: bytes) -> Tuple[int, int, int, bytes]:
+    # Accepts exactly what PATTERN accepts for ASCII input, but locates the separators by position
+    # instead of running the regex. Returns (min, max, char code, phrase).
+    end = len(line)
+    if line.endswith(b"\n"):
+        end -= 2 if line.endswith(b"\r\n") else 1
+    dash = line.find(b"-", 0, end)
+    colon = line.find(b":", dash + 1, end)
+    if 0 < dash < colon - 1:
+        low = line[:dash].rstrip(WHITESPACE)
+        high = line[dash + 1:colon - 1].strip(WHITESPACE)
+        char = line[colon - 1:colon]
+        phrase = line[colon + 1:end].lstrip(WHITESPACE)
+        if low.isdigit() and high.isdigit() and char.isalpha() and phrase.isalpha():
+            return int(low), int(high), char[0], phrase
+    # report the line the way text mode would have read it
+    text = line[:end].decode(errors="replace") + ("\n" if end < len(line) else "")
+    raise ValueError("Cannot parse line '%s'" % text)
+
+
+def _parse_line_regex(line: str) -> Tuple[int, int, int, bytes]:
+    m = PATTERN.match(line)
+    if m:
+        return int(m.group(1)), int(m.group(2)), ord(m.group(3)), m.group(4).encode("ascii")
+    raise ValueError("Cannot parse line '%s'" % line)
+
+
+def load_columns(input_path: str, chunk_bytes: int = CHUNK_BYTES, parser: str = PARSER_REGEX) -> Iterator[RuleColumns]:
+    if parser == PARSER_FAST:
+        with open(input_path, 'rb') as input_file:
+            while True:
+                block = input_file.read(chunk_bytes)
+                if not block:
+                    break
+                # finish the last line, so that no line is split between two blocks
+                block += input_file.readline()
+                yield _parse_block_fast(block)
+    elif parser == PARSER_REGEX:
+        with open(input_path, 'r') as input_file:
+            while True:
+                lines = input_file.readlines(chunk_bytes)
+                if not lines:
+                    break
+                yield _parse_lines_regex(lines)
+    else:
+        raise ValueError("Unknown parser '%s'" % parser)
+
+
+def _parse_lines_regex(lines: Iterable[str]) -> RuleColumns:
+    columns = RuleColumns()
+    for line in lines:
+        min_occurrences, max_occurrences, char, phrase = _parse_line_regex(line)
+        columns.append(min_occurrences, max_occurrences, char, phrase)
+    return columns
+
+
+def _parse_block_fast(block: bytes) -> RuleColumns:
+    columns = RuleColumns()
+    if CANONICAL_BLOCK.fullmatch(block):
+        tokens = block.translate(SEPARATORS).split()
+        columns.extend(map(int, tokens[0::4]), map(int, tokens[1::4]), b"".join(tokens[2::4]), tokens[3::4])
+    else:
+        for line in block.splitlines(keepends=True):
+            min_occurrences, max_occurrences, char, phrase = parse_line_fast(line)
+            columns.append(min_occurrences, max_occurrences, char, phrase)
+    return columns
+
+
+def validate_columns(chunks: Iterable[RuleColumns]) -> Tuple[int, int]:
+    valid_occurrences = 0
+    valid_positions = 0
+    for columns in chunks:
+        occurrences, positions = columns.count_valid()
+        valid_occurrences += occurrences
+        valid_positions += positions
+    return valid_occurrences, valid_positions
+
+
+class StreamValidator:
+    # Keeps running counts for both policies over a growing file. The byte offset of the first line that hasn't
+    # been consumed yet is part of the state, so a restarted consumer picks up right where the previous one stopped.
+
+    def __init__(
+            self,
+            offset: int = 0,
+            entries: int = 0,
+            valid_occurrences: int = 0,
+            valid_positions: int = 0,
+            parser: str = PARSER_FAST
+    ):
+        if parser not in (PARSER_FAST, PARSER_REGEX):
+            raise ValueError("Unknown parser '%s'" % parser)
+        self.offset = offset
+        self.entries = entries
+        self.valid_occurrences = valid_occurrences
+        self.valid_positions = valid_positions
+        self.parser = parser
+
+    def reset(self) -> None:
+        self.offset = 0
+        self.entries = 0
+        self.valid_occurrences = 0
+        self.valid_positions = 0
+
+    def feed(self, line: bytes) -> None:
+        if self.parser == PARSER_FAST:
+            min_occurrences, max_occurrences, char, phrase = parse_line_fast(line)
+        else:
+            text = line.decode()
+            if text.endswith("\r\n"):
+                # the line the way a file opened in text mode would give it
+                text = text[:-2] + "\n"
+            min_occurrences, max_occurrences, char, phrase = _parse_line_regex(text)
+        rule = Rule(min_occurrences, max_occurrences, chr(char))
+        text = phrase.decode("ascii")
+        if rule.validate_occurrences(text):
+            self.valid_occurrences += 1
+        if rule.validate_positions(text):
+            self.valid_positions += 1
+        self.entries += 1
+        self.offset += len(line)
+
+    def follow(self, input_path: str, poll_interval: float or None = None) -> Iterator[Tuple[int, int]]:
+        # Yields the current counts after every new line. Stops at the end of the file, unless poll_interval is given -
+        # then it keeps waiting for more lines. A trailing line without line break is left for the next round.
+        with open(input_path, 'rb') as input_file:
+            if os.fstat(input_file.fileno()).st_size < self.offset:
+                # the file has been truncated or replaced - start over
+                self.reset()
+            input_file.seek(self.offset)
+            while True:
+                line = input_file.readline()
+                if line.endswith(b"\n"):
+                    self.feed(line)
+                    yield self.valid_occurrences, self.valid_positions
+                    continue
+                # nothing more (or just a partial line) for now
+                input_file.seek(self.offset)
+                if poll_interval is None:
+                    return
+                time.sleep(poll_interval)
+
+    def save(self, state_path: str) -> None:
+        tmp_path = state_path + ".tmp"
+        with open(tmp_path, 'w') as state_file:
+            json.dump(
+                {
+                    "offset": self.offset,
+                    "entries": self.entries,
+                    "valid_occurrences": self.valid_occurrences,
+                    "valid_positions": self.valid_positions
+                },
+                state_file
+            )
+        os.replace(tmp_path, state_path)
+
+    @staticmethod
+    def restore(state_path: str, parser: str = PARSER_FAST) -> 'StreamValidator':
+        if not os.path.exists(state_path):
+            return StreamValidator(parser=parser)
+        with open(state_path, 'r') as state_file:
+            state = json.load(state_file)
+        return StreamValidator(
+            offset=state["offset"],
+            entries=state["entries"],
+            valid_occurrences=state["valid_occurrences"],
+            valid_positions=state["valid_positions"],
+            parser=parser
+        )
+
+
+def split_ranges(input_path: str, parts: int) -> List[Tuple[int, int]]:
+    # Splits the file into (start, end) byte ranges, each of them starting right after a line break
+    size = os.path.getsize(input_path)
+    boundaries = [0]
+    with open(input_path, 'rb') as input_file:
+        for i in range(1, parts):
+            position = max(size * i // parts, boundaries[-1])
+            if position <= 0:
+                # more parts than bytes - nothing to split before the first byte
+                continue
+            if position >= size:
+                break
+            # finish the line we've landed in (or just consume the line break right before the position)
+            input_file.seek(position - 1)
+            input_file.readline()
+            boundary = input_file.tell()
+            if boundary >= size:
+                break
+            if boundary > boundaries[-1]:
+                boundaries.append(boundary)
+    boundaries.append(size)
+    return [(boundaries[i], boundaries[i + 1]) for i in range(len(boundaries) - 1)]
+
+
+def _read_range(input_path: str, start: int, end: int, chunk_bytes: int = CHUNK_BYTES) -> Iterator[bytes]:
+    # yields blocks of whole lines - the range itself starts and ends at a line boundary
+    with open(input_path, 'rb') as input_file:
+        input_file.seek(start)
+        position = start
+        while position < end:
+            block = input_file.read(min(chunk_bytes, end - position))
+            if not block:
+                break
+            if position + len(block) < end:
+                block += input_file.readline()
+            position += len(block)
+            yield block
+
+
+def _validate_range(input_path: str, byte_range: Tuple[int, int], parser: str) -> Tuple[int, int]:
+    # runs in a worker process - only the two counts travel back to the parent
+    blocks = _read_range(input_path, byte_range[0], byte_range[1])
+    if parser == PARSER_FAST:
+        return validate_columns(_parse_block_fast(block) for block in blocks)
+    # read the raw bytes the way load_columns reads the file in text mode, e.g. with \r\n turned into \n
+    return validate_columns(_parse_lines_regex(io.TextIOWrapper(io.BytesIO(block))) for block in blocks)
+
+
+def validate_parallel(
+        input_path: str,
+        workers: int or None = None,
+        parser: str = PARSER_REGEX
+) -> Tuple[int, int]:
+    workers = workers if workers is not None else os.cpu_count()
+    ranges = split_ranges(input_path, workers * RANGES_PER_WORKER)
+    valid_occurrences = 0
+    valid_positions = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for occurrences, positions in executor.map(_validate_range, repeat(input_path), ranges, repeat(parser)):
+            valid_occurrences += occurrences
+            valid_positions += positions
+    return valid_occurrences, valid_positions
+
+
+def benchmark_parallel(
+        input_path: str,
+        max_workers: int or None = None,
+        parser: str = PARSER_REGEX
+) -> List[Tuple[int, float]]:
+    max_workers = max_workers if max_workers is not None else os.cpu_count()
+    t = time.perf_counter()
+    expected = validate_columns(load_columns(input_path, parser=parser))
+    baseline = time.perf_counter() - t
+    print("workers  seconds  speedup")
+    print("%7s  %7.3f  %7.2f" % ("serial", baseline, 1.0))
+    ret_val: List[Tuple[int, float]] = []
+    workers = 1
+    while True:
+        t = time.perf_counter()
+        counts = validate_parallel(input_path, workers, parser)
+        elapsed = time.perf_counter() - t
+        if counts != expected:
+            raise RuntimeError(
+                "Parallel validation with %d workers counted %s instead of %s" % (workers, counts, expected)
+            )
+        print("%7d  %7.3f  %7.2f" % (workers, elapsed, baseline / elapsed))
+        ret_val.append((workers, elapsed))
+        if workers >= max_workers:
+            break
+        workers = min(workers * 2, max_workers)
+    return ret_val
+
+
 def validate_occurrences(input_list: List[Tuple[Rule, str]]) -> int:
     return validate(input_list, lambda rule, phrase: rule.validate_occurrences(phrase))
 
@@ -61,13 +405,35 @@ def validate(input_list: List[Tuple[Rule, str]], test: Callable[[Rule, str], boo
     return valid_entries
 
 
-def main() -> None:
-    input_list = load("./input.txt")
-    valid_entries = validate_occurrences(input_list)
-    print("Valid entries according to occurrences: %d" % valid_entries)
+def main(argv: List[str] or None = None) -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input", default="./input.txt", help="the password database, one entry per line")
+    parser.add_argument("--workers", type=int, default=None, help="validate in this many processes")
+    parser.add_argument("--benchmark", action="store_true", help="measure the speedup for growing worker counts")
+    parser.add_argument("--parser", choices=[PARSER_FAST, PARSER_REGEX], default=PARSER_FAST)
+    parser.add_argument("--state", default=None, help="count only lines added since the run that saved this state")
+    args = parser.parse_args(argv)
+
+    if args.state is not None:
+        validator = StreamValidator.restore(args.state, args.parser)
+        for _ in validator.follow(args.input):
+            pass
+        validator.save(args.state)
+        print("Entries consumed so far: %d (up to byte %d)" % (validator.entries, validator.offset))
+        print("Valid entries according to occurrences: %d" % validator.valid_occurrences)
+        print("Valid entries according to positions: %d" % validator.valid_positions)
+        return
+
+    if args.benchmark:
+        benchmark_parallel(args.input, args.workers, args.parser)
+        return
 
-    valid_entries = validate_positions(input_list)
-    print("Valid entries according to positions: %d" % valid_entries)
+    if args.workers is not None:
+        valid_occurrences, valid_positions = validate_parallel(args.input, args.workers, args.parser)
+    else:
+        valid_occurrences, valid_positions = validate_columns(load_columns(args.input, parser=args.parser))
+    print("Valid entries according to occurrences: %d" % valid_occurrences)
+    print("Valid entries according to positions: %d" % valid_positions)
 
 
 if __name__ == "__main__":
@@ -1,60 +1,197 @@
-from typing import Tuple, List
+import math
+import mmap
+from typing import Tuple, List, Dict, Iterable
+
+try:
+    import numpy
+except ImportError:
+    # numpy is optional - without it the rows are kept as python int bitsets
+    numpy = None
 
 FREE = "."
 OBSTACLE = "#"
+OBSTACLE_BYTE = ord(OBSTACLE)
+BITS = str.maketrans({FREE: "0", OBSTACLE: "1"})
+# upper bound on the number of (slope, row) cells gathered at once
+BATCH_CELLS = 1 << 22
 
 
 class TerrainMap:
 
-    def __init__(self, terrain: List[str]):
-        self.terrain = terrain
-        self.width = len(terrain[0])
-        self.height = len(terrain)
+    def __init__(self, terrain: Iterable[str]):
+        # Every row is a bitset, bit c is set when there's an obstacle in column c.
+        # With numpy the bitsets are packed into a (height, ceil(width / 8)) array of bytes, otherwise we keep
+        # a python int per row. The rows get packed one by one, so the text of the terrain is never held in full.
+        self.width = 0
+        self.height = 0
+        self.packed = None
+        self.rows: List[int] or None = None
+        packed = bytearray()
+        rows: List[int] = []
+        for row in terrain:
+            if self.height == 0:
+                self.width = len(row)
+            elif len(row) != self.width:
+                raise ValueError("Row %d is %d wide, expected %d" % (self.height, len(row), self.width))
+            if numpy is not None:
+                cells = numpy.frombuffer(row.encode(), dtype=numpy.uint8)
+                packed += numpy.packbits(cells == OBSTACLE_BYTE, bitorder="little").tobytes()
+            else:
+                rows.append(int(row[::-1].translate(BITS), 2))
+            self.height += 1
+        if self.width == 0:
+            raise ValueError("The terrain is empty")
+        if numpy is not None:
+            self.packed = numpy.frombuffer(packed, dtype=numpy.uint8).reshape(self.height, -1)
+        else:
+            self.rows = rows
+
+    def close(self) -> None:
+        # nothing to release for a terrain living in memory
+        pass
+
+    def __enter__(self) -> 'TerrainMap':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
 
     def evaluate_slope(self, direction: Tuple[int, int], start: Tuple[int, int] = (0, 0)) -> int:
-        current = start
-        obstacles = 0
-        while current[0] < self.height:
-            if self.terrain[current[0]][current[1]] == OBSTACLE:
-                obstacles += 1
-            current = (current[0] + direction[0], (current[1] + direction[1]) % self.width)
-        return obstacles
-
-
-def load(input_path: str) -> TerrainMap:
-    terrain: List[str] = []
+        _check_direction(direction)
+        return _count(self._hits(direction[0], [direction[1]], start)[0])
+
+    def evaluate_slopes(
+            self,
+            directions: Iterable[Tuple[int, int]],
+            start: Tuple[int, int] = (0, 0)
+    ) -> Tuple[Dict[Tuple[int, int], int], int]:
+        # Slopes sharing a common divisor visit a subset of the positions of their reduced slope -
+        # e.g. (2, 6) stops at every second position of (1, 3). So we walk every reduced slope just once
+        # and derive the counts of its multiples by striding over its hits.
+        directions = list(directions)
+        families: Dict[Tuple[int, int], List[Tuple[Tuple[int, int], int]]] = {}
+        for direction in directions:
+            _check_direction(direction)
+            divisor = math.gcd(direction[0], direction[1])
+            base = (direction[0] // divisor, direction[1] // divisor)
+            families.setdefault(base, []).append((direction, divisor))
+
+        # reduced slopes with the same vertical step visit the same rows - those are evaluated together
+        by_step: Dict[int, List[int]] = {}
+        for dy, dx in families.keys():
+            by_step.setdefault(dy, []).append(dx)
+
+        counts: Dict[Tuple[int, int], int] = {}
+        for dy, dxs in by_step.items():
+            visited_rows = max(1, len(range(start[0], self.height, dy)))
+            batch = max(1, BATCH_CELLS // visited_rows)
+            for offset in range(0, len(dxs), batch):
+                chunk = dxs[offset:offset + batch]
+                hits = self._hits(dy, chunk, start)
+                for dx, slope_hits in zip(chunk, hits):
+                    for direction, divisor in families[(dy, dx)]:
+                        counts[direction] = _count(slope_hits[::divisor])
+
+        product = 1
+        for direction in directions:
+            product *= counts[direction]
+        return counts, product
+
+    def _hits(self, dy: int, dxs: List[int], start: Tuple[int, int] = (0, 0)):
+        # For each of the slopes (dy, dx) a sequence with 1 for every visited position with an obstacle
+        # and 0 for the free ones, in the order they're visited. The rows are walked just once for all of them.
+        if self.packed is not None:
+            rows = self.packed[start[0]::dy]
+            steps = numpy.arange(len(rows), dtype=numpy.int64)
+            cols = (start[1] + numpy.array(dxs, dtype=numpy.int64)[:, None] * steps[None, :]) % self.width
+            return (rows[steps[None, :], cols >> 3] >> (cols & 7).astype(numpy.uint8)) & 1
+
+        hits: List[List[int]] = [[] for _ in dxs]
+        cols = [start[1] % self.width for _ in dxs]
+        slopes = range(len(dxs))
+        for row in range(start[0], self.height, dy):
+            bits = self.rows[row]
+            for i in slopes:
+                hits[i].append((bits >> cols[i]) & 1)
+                cols[i] = (cols[i] + dxs[i]) % self.width
+        return hits
+
+
+class MappedTerrainMap(TerrainMap):
+    # Reads the terrain straight from the mmapped input file. All the rows have the same width, so the position
+    # of any cell can be computed and only the rows a slope actually visits are ever read from the disk.
+
+    def __init__(self, input_path: str):
+        with open(input_path, 'rb') as input_file:
+            self.mapped = mmap.mmap(input_file.fileno(), 0, access=mmap.ACCESS_READ)
+        line_break = self.mapped.find(b"\n")
+        if line_break < 0:
+            line_break = len(self.mapped)
+        self.width = line_break
+        self.stride = line_break + 1
+        if line_break > 0 and self.mapped[line_break - 1] == ord("\r"):
+            self.width -= 1
+        if self.width == 0:
+            self.mapped.close()
+            raise ValueError("The terrain in '%s' is empty" % input_path)
+        # the last line might come without a line break
+        self.height = (len(self.mapped) + self.stride - 1) // self.stride
+        if len(self.mapped) not in (self.height * self.stride, self.height * self.stride - (self.stride - self.width)):
+            # the rows have to be as wide as the first one, otherwise the positions of the cells can't be computed
+            self.mapped.close()
+            raise ValueError("The rows in '%s' aren't all %d wide" % (input_path, self.width))
+        self.packed = None
+        self.rows = None
+        self.cells = numpy.frombuffer(self.mapped, dtype=numpy.uint8) if numpy is not None else None
+
+    def close(self) -> None:
+        # the numpy view has to go first, a mapping with exported buffers can't be closed
+        self.cells = None
+        self.mapped.close()
+
+    def _hits(self, dy: int, dxs: List[int], start: Tuple[int, int] = (0, 0)):
+        if self.cells is not None:
+            rows = numpy.arange(start[0], self.height, dy, dtype=numpy.int64)
+            steps = numpy.arange(len(rows), dtype=numpy.int64)
+            cols = (start[1] + numpy.array(dxs, dtype=numpy.int64)[:, None] * steps[None, :]) % self.width
+            return (self.cells[rows[None, :] * self.stride + cols] == OBSTACLE_BYTE).astype(numpy.uint8)
+
+        hits: List[List[int]] = [[] for _ in dxs]
+        cols = [start[1] % self.width for _ in dxs]
+        slopes = range(len(dxs))
+        cells = self.mapped
+        for row in range(start[0], self.height, dy):
+            offset = row * self.stride
+            for i in slopes:
+                hits[i].append(1 if cells[offset + cols[i]] == OBSTACLE_BYTE else 0)
+                cols[i] = (cols[i] + dxs[i]) % self.width
+        return hits
+
+
+def _check_direction(direction: Tuple[int, int]) -> None:
+    if direction[0] <= 0:
+        raise ValueError("The slope has to go down, received direction %s" % str(direction))
+
+
+def _count(hits) -> int:
+    if numpy is not None and isinstance(hits, numpy.ndarray):
+        return int(hits.sum(dtype=numpy.int64))
+    return sum(hits)
+
+
+def load(input_path: str, mapped: bool = False) -> TerrainMap:
+    if mapped:
+        return MappedTerrainMap(input_path)
     with open(input_path, 'r') as input_file:
-        for line in input_file:
-            terrain.append(line.strip())
-    return TerrainMap(terrain)
+        return TerrainMap(line.strip() for line in input_file)
 
 
 def main() -> None:
     terrain = load("./input.txt")
-    direction = (1, 3)
-    obstacles = terrain.evaluate_slope(direction)
-    log_encountered_obstacles(direction, obstacles)
-
-    product = obstacles
-    direction = (1, 1)
-    obstacles = terrain.evaluate_slope(direction)
-    log_encountered_obstacles(direction, obstacles)
-    product *= obstacles
-
-    direction = (1, 5)
-    obstacles = terrain.evaluate_slope(direction)
-    log_encountered_obstacles(direction, obstacles)
-    product *= obstacles
-
-    direction = (1, 7)
-    obstacles = terrain.evaluate_slope(direction)
-    log_encountered_obstacles(direction, obstacles)
-    product *= obstacles
-
-    direction = (2, 1)
-    obstacles = terrain.evaluate_slope(direction)
-    log_encountered_obstacles(direction, obstacles)
-    product *= obstacles
+    directions = [(1, 3), (1, 1), (1, 5), (1, 7), (2, 1)]
+    counts, product = terrain.evaluate_slopes(directions)
+    for direction in directions:
+        log_encountered_obstacles(direction, counts[direction])
 
     print("The product is %d" % product)
 
@@ -0,0 +1,125 @@
+import os
+import random
+import tempfile
+import unittest
+from typing import List, Tuple
+from unittest import mock
+
+from aoc2020.task03 import task03
+from aoc2020.task03.task03 import load, TerrainMap
+
+EXAMPLE = [
+    "..##.......",
+    "#...#...#..",
+    ".#....#..#.",
+    "..#.#...#.#",
+    ".#...##..#.",
+    "..#.##.....",
+    ".#.#.#....#",
+    ".#........#",
+    "#.##...#...",
+    "#...##....#",
+    ".#..#...#.#",
+]
+
+
+def walk(terrain: List[str], direction: Tuple[int, int], start: Tuple[int, int] = (0, 0)) -> int:
+    # the straightforward walk over the text of the terrain
+    row, col = start
+    obstacles = 0
+    while row < len(terrain):
+        if terrain[row][col] == "#":
+            obstacles += 1
+        row, col = row + direction[0], (col + direction[1]) % len(terrain[0])
+    return obstacles
+
+
+class TerrainTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _write(self, content: str, name: str = "input.txt") -> str:
+        path = os.path.join(self.tmp_dir.name, name)
+        with open(path, 'w', newline="") as f:
+            f.write(content)
+        return path
+
+    def _backends(self, terrain: List[str]) -> List[TerrainMap]:
+        path = self._write("\n".join(terrain) + "\n")
+        mapped = load(path, mapped=True)
+        self.addCleanup(mapped.close)
+        return [TerrainMap(terrain), load(path), mapped]
+
+    def test_example(self):
+        for terrain_map in self._backends(EXAMPLE):
+            self.assertEqual(7, terrain_map.evaluate_slope((1, 3)))
+            self.assertEqual(2, terrain_map.evaluate_slope((2, 1)))
+
+    def test_evaluate_slope(self):
+        # compare all of the backends with the walk, with and without numpy
+        rnd = random.Random(3)
+        for use_numpy in [True, False]:
+            with mock.patch.object(task03, "numpy", task03.numpy if use_numpy else None):
+                for _ in range(100):
+                    width = rnd.randint(1, 20)
+                    terrain = ["".join(rnd.choice(".#") for _ in range(width)) for _ in range(rnd.randint(1, 30))]
+                    backends = self._backends(terrain)
+                    for _ in range(5):
+                        direction = (rnd.randint(1, 4), rnd.randint(0, 25))
+                        start = (rnd.randint(0, len(terrain)), rnd.randint(0, width - 1))
+                        expected = walk(terrain, direction, start)
+                        for terrain_map in backends:
+                            self.assertEqual(expected, terrain_map.evaluate_slope(direction, start))
+
+    def test_evaluate_slopes(self):
+        # multiples like (2, 6) and (3, 9) are derived from the hits of (1, 3), also across several batches
+        rnd = random.Random(4)
+        directions = [(1, 3), (2, 6), (3, 9), (1, 1), (2, 2), (2, 1), (4, 2), (1, 0), (3, 0), (1, 5), (1, 7)]
+        for use_numpy in [True, False]:
+            for batch_cells in [task03.BATCH_CELLS, 7]:
+                with mock.patch.object(task03, "numpy", task03.numpy if use_numpy else None), \
+                        mock.patch.object(task03, "BATCH_CELLS", batch_cells):
+                    for _ in range(20):
+                        width = rnd.randint(1, 20)
+                        terrain = ["".join(rnd.choice(".#") for _ in range(width)) for _ in range(rnd.randint(1, 40))]
+                        start = (rnd.randint(0, 2), rnd.randint(0, width - 1))
+                        expected = {direction: walk(terrain, direction, start) for direction in directions}
+                        product = 1
+                        for obstacles in expected.values():
+                            product *= obstacles
+                        for terrain_map in self._backends(terrain):
+                            self.assertEqual((expected, product), terrain_map.evaluate_slopes(directions, start))
+
+        counts, product = TerrainMap(EXAMPLE).evaluate_slopes([(1, 1), (1, 3), (1, 5), (1, 7), (2, 1)])
+        self.assertEqual({(1, 1): 2, (1, 3): 7, (1, 5): 3, (1, 7): 4, (2, 1): 2}, counts)
+        self.assertEqual(336, product)
+
+    def test_mapped_line_breaks(self):
+        # windows line breaks and a last line without any line break
+        for use_numpy in [True, False]:
+            with mock.patch.object(task03, "numpy", task03.numpy if use_numpy else None):
+                for i, (separator, last) in enumerate([("\r\n", ""), ("\n", ""), ("\r\n", "\r\n")]):
+                    path = self._write(separator.join(EXAMPLE) + last, "input_%d.txt" % i)
+                    with load(path, mapped=True) as terrain_map:
+                        self.assertEqual(len(EXAMPLE[0]), terrain_map.width)
+                        self.assertEqual(len(EXAMPLE), terrain_map.height)
+                        self.assertEqual(({(1, 3): 7, (2, 1): 2}, 14), terrain_map.evaluate_slopes([(1, 3), (2, 1)]))
+                    self.assertTrue(terrain_map.mapped.closed)
+
+    def test_mapped_empty_terrain(self):
+        # also the ragged ones, which can't be mapped
+        for content in ["\n", "\r\n", "\n..#\n", "..#\n#...\n.#.\n", "..#\n.#.\n\n", "..#\r\n.#.\n"]:
+            self.assertRaises(ValueError, load, self._write(content), True)
+
+    def test_invalid_terrain(self):
+        self.assertRaises(ValueError, TerrainMap, [])
+        self.assertRaises(ValueError, TerrainMap, ["..#", ".#"])
+        self.assertRaises(ValueError, TerrainMap([".#"]).evaluate_slope, (0, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+import os
+import tempfile
+import unittest
+
+from aoc2020.task04 import task04
+from aoc2020.task04.task04 import load, build_report, iter_passports, validate_parallel, split_ranges, \
+    count_entries, ValidationReport, enable_profiling, disable_profiling, Validator
+
+
+class PassportTest(unittest.TestCase):
+
+    BATCH = """eyr:1972 cid:100
+hcl:#18171d ecl:amb hgt:170 pid:186cm iyr:2018 byr:1926
+
+iyr:2019
+hcl:#602927 eyr:1967 hgt:170cm
+ecl:grn pid:012533040 byr:1946
+
+pid:087499704 hgt:74in ecl:grn iyr:2012 eyr:2030 byr:1980
+hcl:#623a2f
+
+eyr:2029 ecl:blu cid:129 byr:1989
+iyr:2014 pid:896056539 hcl:#a97842 hgt:165cm
+
+hcl:#888785
+hgt:164cm byr:2001 iyr:2015 cid:88
+pid:545766238 ecl:hzl
+eyr:2022
+
+iyr:2010 hgt:158cm hcl:#b6652a ecl:blu byr:1944 eyr:2021
+"""
+
+    def setUp(self):
+        debug = task04.DEBUG
+        self.addCleanup(setattr, task04, "DEBUG", debug)
+        task04.DEBUG = False
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.input_path = os.path.join(self.tmp_dir.name, "input.txt")
+        with open(self.input_path, 'w') as f:
+            f.write(PassportTest.BATCH)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_validator(self):
+        # the edge values of every check, the digits are the unicode ones \d used to accept
+        cases = [
+            ("hgt", "cm", False),
+            ("hgt", "in", False),
+            ("hgt", "170", False),
+            ("hgt", "+170cm", False),
+            ("hgt", " 170cm", False),
+            ("hgt", "0150cm", True),
+            ("hgt", "149cm", False),
+            ("hgt", "193cm", True),
+            ("hgt", "194cm", False),
+            ("hgt", "59in", True),
+            ("hgt", "77in", False),
+            ("hgt", "170CM", False),
+            ("hgt", "\u0661\u0667\u0660cm", True),
+            ("hgt", "1\u00b970cm", False),
+            ("hcl", "#123abc", True),
+            ("hcl", "#123ABC", False),
+            ("hcl", "#12345g", False),
+            ("hcl", "#12345", False),
+            ("hcl", "#1234567", False),
+            ("hcl", "123abc", False),
+            ("pid", "000000001", True),
+            ("pid", "00000001", False),
+            ("pid", "0123456789", False),
+            ("pid", "+12345678", False),
+            ("pid", "\uff10\uff11\uff12\uff13\uff14\uff15\uff16\uff17\uff18", True),
+            ("pid", "12345678\u00b2", False),
+            ("byr", "1920", True),
+            ("byr", "1919", False),
+            ("byr", "2002", True),
+            ("byr", "2003", False),
+            ("byr", "+1950", False),
+            ("byr", "01950", False),
+            ("byr", "\u0661\u0669\u0665\u0660", True),
+        ]
+        validations = {
+            "hgt": Validator.validate_height,
+            "hcl": Validator.validate_hair_color,
+            "pid": Validator.validate_id,
+            "byr": task04.Fields.BIRTH_YEAR.validation_fn,
+        }
+        for field, value, expected in cases:
+            with self.subTest(field=field, value=value):
+                self.assertEqual(expected, validations[field](value))
+                if field == "byr":
+                    self.assertEqual(expected, Validator.validate_year(
+                        value, Validator.BIRTH_YEAR_MIN, Validator.BIRTH_YEAR_MAX))
+
+    def test_counts(self):
+        self.assertEqual(6, len(load(self.input_path)))
+        self.assertEqual((6, 5, 3), count_entries(iter_passports(self.input_path)))
+
+    def test_report(self):
+        report = build_report(iter_passports(self.input_path))
+        self.assertEqual((6, 5, 3), (report.total, report.with_all_fields, report.valid))
+        self.assertEqual({"pid": 1}, report.missing)
+        self.assertEqual({"eyr": 2, "hgt": 1, "pid": 1}, report.failed)
+
+    def test_parallel_report(self):
+        expected = build_report(iter_passports(self.input_path))
+        for parts in [1, 2, 3, 10]:
+            report = ValidationReport()
+            for byte_range in split_ranges(self.input_path, parts):
+                report.merge(task04._report_range(self.input_path, byte_range))
+            self.assertEqual(expected, report)
+        self.assertEqual(expected, validate_parallel(self.input_path, 2))
+
+    def test_profiling(self):
+        plan = task04.PLAN
+        profiler = enable_profiling(reorder_every=5)
+        # puts the plan back even if an assertion fails, disabling twice is harmless
+        self.addCleanup(disable_profiling, profiler)
+        self.assertIsNot(plan, task04.PLAN)
+        passports = load(self.input_path)
+        self.assertEqual(3, sum(1 for passport in passports if passport.is_valid()))
+        disable_profiling(profiler)
+        self.assertIs(plan, task04.PLAN)
+
+        stats = profiler.to_dict()
+        self.assertEqual(stats["calls"], sum(field["calls"] for field in stats["fields"].values()))
+        self.assertEqual(2, stats["fields"]["eyr"]["failed"])
+        # the only check that ever failed goes first
+        self.assertEqual("eyr", stats["order"][0])
+        # the learned order doesn't change the results
+        adaptive = profiler.adaptive_plan()
+        for p in passports:
+            self.assertEqual(plan.is_valid(p.fields, p.mask), adaptive.is_valid(p.fields, p.mask))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,19 @@
+import argparse
+import copy
+import json
+import mmap
+import os
 import re
-from typing import List, Callable, Pattern
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import List, Callable, Dict, Tuple, Iterable, Iterator
 
 DEBUG = True
+# records are separated by lines with nothing but whitespace on them
+RECORD_SEPARATOR = re.compile(b"\\n[^\\S\\n]*\\n")
+# every worker gets a few byte ranges, so that a slow range doesn't leave the other workers idle
+RANGES_PER_WORKER = 4
 
 
 def log(msg: str) -> None:
@@ -9,6 +21,60 @@ def log(msg: str) -> None:
         print(msg)
 
 
+class Validator:
+    HEIGHT_CM_MIN = 150
+    HEIGHT_CM_MAX = 193
+    HEIGHT_IN_MIN = 59
+    HEIGHT_IN_MAX = 76
+    BIRTH_YEAR_MIN = 1920
+    BIRTH_YEAR_MAX = 2002
+    ISSUE_YEAR_MIN = 2010
+    ISSUE_YEAR_MAX = 2020
+    EXPIRATION_YEAR_MIN = 2020
+    EXPIRATION_YEAR_MAX = 2030
+    EYE_COLORS = frozenset([
+        "amb", "blu", "brn", "gry", "grn", "hzl", "oth"
+    ])
+    HEX_DIGITS = frozenset("0123456789abcdef")
+
+    # str.isdecimal() accepts exactly the characters \d does, so these match the former regex based checks
+
+    @staticmethod
+    def validate_eye_color(eye_color: str) -> bool:
+        return eye_color in Validator.EYE_COLORS
+
+    @staticmethod
+    def validate_hair_color(hair_color: str) -> bool:
+        return len(hair_color) == 7 and hair_color[0] == "#" and Validator.HEX_DIGITS.issuperset(hair_color[1:])
+
+    @staticmethod
+    def validate_year(year: str, min_year: int, max_year: int) -> bool:
+        return len(year) == 4 and year.isdecimal() and (min_year <= int(year) <= max_year)
+
+    @staticmethod
+    def year_validation(min_year: int, max_year: int) -> Callable[[str], bool]:
+        # validate_year with the bounds bound in a closure - cheaper to call than a partial with keywords
+        def validate(year: str) -> bool:
+            return len(year) == 4 and year.isdecimal() and (min_year <= int(year) <= max_year)
+        return validate
+
+    @staticmethod
+    def validate_height(height: str) -> bool:
+        value = height[:-2]
+        if not value.isdecimal():
+            return False
+        unit = height[-2:]
+        if unit == "cm":
+            return Validator.HEIGHT_CM_MIN <= int(value) <= Validator.HEIGHT_CM_MAX
+        if unit == "in":
+            return Validator.HEIGHT_IN_MIN <= int(value) <= Validator.HEIGHT_IN_MAX
+        return False
+
+    @staticmethod
+    def validate_id(id_str: str) -> bool:
+        return len(id_str) == 9 and id_str.isdecimal()
+
+
 class Field:
 
     def __init__(self, name: str, validation: Callable[[str], bool]):
@@ -20,47 +86,44 @@ class Fields:
 
     BIRTH_YEAR = Field(
         name="byr",
-        validation=lambda val: Validator.validate_year(
-            year=val,
+        validation=Validator.year_validation(
             min_year=Validator.BIRTH_YEAR_MIN,
             max_year=Validator.BIRTH_YEAR_MAX
         )
     )
     ISSUE_YEAR = Field(
         name="iyr",
-        validation=lambda val: Validator.validate_year(
-            year=val,
+        validation=Validator.year_validation(
             min_year=Validator.ISSUE_YEAR_MIN,
             max_year=Validator.ISSUE_YEAR_MAX
         )
     )
     EXPIRATION_YEAR = Field(
         name="eyr",
-        validation=lambda val: Validator.validate_year(
-            year=val,
+        validation=Validator.year_validation(
             min_year=Validator.EXPIRATION_YEAR_MIN,
             max_year=Validator.EXPIRATION_YEAR_MAX
         )
     )
     HEIGHT = Field(
         name="hgt",
-        validation=lambda val: Validator.validate_height(val)
+        validation=Validator.validate_height
     )
     HAIR_COLOR = Field(
         name="hcl",
-        validation=lambda val: Validator.validate_hair_color(val)
+        validation=Validator.validate_hair_color
     )
     EYE_COLOR = Field(
         name="ecl",
-        validation=lambda val: Validator.validate_eye_color(val)
+        validation=Validator.validate_eye_color
     )
     PASSPORT_ID = Field(
         name="pid",
-        validation=lambda val: Validator.validate_id(val)
+        validation=Validator.validate_id
     )
     COUNTRY_ID = Field(
         name="cid",
-        validation=lambda val: Validator.validate_id(val)
+        validation=Validator.validate_id
     )
 
     REQUIRED = [
@@ -87,132 +150,373 @@ class Fields:
     ALL_NAMES = [f.name for f in ALL]
 
 
+class ValidationPlan:
+    # Built once from a list of fields. Every known field gets a bit, so the presence of the required ones
+    # is a single mask comparison, and the checks are kept as a flat tuple of (name, function) pairs.
+
+    def __init__(self, required: List[Field], known: List[Field]):
+        self.bits: Dict[str, int] = {field.name: 1 << i for i, field in enumerate(known)}
+        self.required_mask = 0
+        for field in required:
+            self.required_mask |= self.bits[field.name]
+        self.checks: Tuple[Tuple[str, Callable[[str], bool]], ...] = tuple(
+            (field.name, field.validation_fn) for field in required
+        )
+
+    def mask_of(self, fields: Dict[str, str]) -> int:
+        mask = 0
+        for name in fields.keys():
+            mask |= self.bits.get(name, 0)
+        return mask
+
+    def has_all_required_fields(self, mask: int) -> bool:
+        return mask & self.required_mask == self.required_mask
+
+    def is_valid(self, fields: Dict[str, str], mask: int) -> bool:
+        if mask & self.required_mask != self.required_mask:
+            return False
+        for name, validation_fn in self.checks:
+            if not validation_fn(fields[name]):
+                return False
+        return True
+
+    def failures(self, fields: Dict[str, str], mask: int) -> Tuple[List[str], List[str]]:
+        # Unlike is_valid this doesn't stop at the first problem - returns all (missing, failed) required fields
+        missing: List[str] = []
+        failed: List[str] = []
+        for name, validation_fn in self.checks:
+            if not mask & self.bits[name]:
+                missing.append(name)
+            elif not validation_fn(fields[name]):
+                failed.append(name)
+        return missing, failed
+
+    def with_checks(self, checks: Iterable[Tuple[str, Callable[[str], bool]]]) -> 'ValidationPlan':
+        plan = copy.copy(self)
+        plan.checks = tuple(checks)
+        return plan
+
+
+PLAN = ValidationPlan(Fields.REQUIRED, Fields.ALL)
+
+
+class FieldStats:
+
+    def __init__(self):
+        self.calls = 0
+        self.nanoseconds = 0
+        self.passed = 0
+        self.failed = 0
+
+    def fail_ratio(self) -> float:
+        return self.failed / self.calls if self.calls > 0 else 0.0
+
+    def mean_nanoseconds(self) -> float:
+        return self.nanoseconds / self.calls if self.calls > 0 else 0.0
+
+
+class ValidationProfiler:
+    # Wraps every check of a plan to record call counts, time spent and pass/fail counts per field.
+    # With reorder_every set, the instrumented plan re-sorts its checks every that many calls, so that the checks
+    # most likely to fail per nanosecond spent go first and is_valid() can bail out sooner.
+    # Nothing of this is in the way unless enable_profiling() swaps the instrumented plan in.
+
+    def __init__(self, plan: ValidationPlan, reorder_every: int or None = None):
+        self.original = plan
+        self.reorder_every = reorder_every
+        self.stats: Dict[str, FieldStats] = {name: FieldStats() for name, _ in plan.checks}
+        self.calls = 0
+        self.plan = plan.with_checks((name, self._instrument(name, fn)) for name, fn in plan.checks)
+
+    def _instrument(self, name: str, validation_fn: Callable[[str], bool]) -> Callable[[str], bool]:
+        stats = self.stats[name]
+
+        def instrumented(value: str) -> bool:
+            start = time.perf_counter_ns()
+            result = validation_fn(value)
+            stats.nanoseconds += time.perf_counter_ns() - start
+            stats.calls += 1
+            if result:
+                stats.passed += 1
+            else:
+                stats.failed += 1
+            self.calls += 1
+            if self.reorder_every is not None and self.calls % self.reorder_every == 0:
+                self.reorder()
+            return result
+
+        return instrumented
+
+    def _score(self, name: str) -> float:
+        stats = self.stats[name]
+        if stats.calls == 0:
+            return 0.0
+        return stats.fail_ratio() / max(stats.mean_nanoseconds(), 1.0)
+
+    def order(self) -> List[str]:
+        # sorted() is stable - checks without any data keep their original relative order
+        return sorted((name for name, _ in self.plan.checks), key=self._score, reverse=True)
+
+    def reorder(self) -> None:
+        checks = dict(self.plan.checks)
+        self.plan.checks = tuple((name, checks[name]) for name in self.order())
+
+    def adaptive_plan(self) -> ValidationPlan:
+        # the uninstrumented plan with the checks in the order learned so far
+        checks = dict(self.original.checks)
+        return self.original.with_checks((name, checks[name]) for name in self.order())
+
+    def to_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "order": [name for name, _ in self.plan.checks],
+            "fields": {
+                name: {
+                    "calls": stats.calls,
+                    "nanoseconds": stats.nanoseconds,
+                    "passed": stats.passed,
+                    "failed": stats.failed,
+                    "fail_ratio": stats.fail_ratio(),
+                    "mean_nanoseconds": stats.mean_nanoseconds()
+                } for name, stats in self.stats.items()
+            }
+        }
+
+    def dump(self, output_path: str) -> None:
+        with open(output_path, 'w') as output_file:
+            json.dump(self.to_dict(), output_file, indent=2)
+
+
+def enable_profiling(reorder_every: int or None = None) -> ValidationProfiler:
+    global PLAN
+    profiler = ValidationProfiler(PLAN, reorder_every)
+    PLAN = profiler.plan
+    return profiler
+
+
+def disable_profiling(profiler: ValidationProfiler, keep_order: bool = False) -> None:
+    global PLAN
+    PLAN = profiler.adaptive_plan() if keep_order else profiler.original
+
+
 class PassportEntry:
 
-    def __init__(self, fields=None):
+    def __init__(self, fields=None, mask: int or None = None):
         self.fields = fields if fields is not None else {}
+        self.mask = mask if mask is not None else PLAN.mask_of(self.fields)
 
     def has_all_required_fields(self) -> bool:
-        missing = sum([
-            (0 if field.name in self.fields.keys() else 1) for field in Fields.REQUIRED
-        ])
-        return missing == 0
+        return PLAN.has_all_required_fields(self.mask)
 
     def is_valid(self) -> bool:
-        if not self.has_all_required_fields():
-            return False
-        for required in Fields.REQUIRED:
-            if not required.validation_fn(self.fields[required.name]):
-                return False
-        return True
+        return PLAN.is_valid(self.fields, self.mask)
 
     @staticmethod
     def parse(raw: str) -> 'PassportEntry' or None:
         entry_segments: List[str] = raw.split()
         fields = {}
+        mask = 0
+        bits = PLAN.bits
         for entry_segment in entry_segments:
             field_segments = entry_segment.split(sep=":")
             if len(field_segments) == 2:
                 field = field_segments[0].strip().lower()
-                if field in Fields.ALL_NAMES:
+                bit = bits.get(field)
+                if bit is not None:
                     fields[field] = field_segments[1].strip()
+                    mask |= bit
                 else:
                     log("Unknown field name '%s'" % field)
             else:
                 log("Invalid field entry '%s'" % entry_segment)
-        return PassportEntry(fields) if len(fields) > 0 else None
-
-
-class Validator:
-    PATTERN_ID = re.compile("^\\d{9}$")
-    PATTERN_HAIR_COLOR = re.compile("^#[0-9a-f]{6}$")
-    PATTERN_HEIGHT = re.compile("^(\\d+)((cm)|(in))$")
-    HEIGHT_CM_MIN = 150
-    HEIGHT_CM_MAX = 193
-    HEIGHT_IN_MIN = 59
-    HEIGHT_IN_MAX = 76
-    PATTERN_YEAR = re.compile("^\\d{4}$")
-    BIRTH_YEAR_MIN = 1920
-    BIRTH_YEAR_MAX = 2002
-    ISSUE_YEAR_MIN = 2010
-    ISSUE_YEAR_MAX = 2020
-    EXPIRATION_YEAR_MIN = 2020
-    EXPIRATION_YEAR_MAX = 2030
-    EYE_COLORS = [
-        "amb", "blu", "brn", "gry", "grn", "hzl", "oth"
-    ]
-
-    @staticmethod
-    def validate_eye_color(eye_color: str) -> bool:
-        return eye_color in Validator.EYE_COLORS
-
-    @staticmethod
-    def validate_hair_color(hair_color: str) -> bool:
-        return Validator.validate_pattern(hair_color, Validator.PATTERN_HAIR_COLOR)
-
-    @staticmethod
-    def validate_year(year: str, min_year: int, max_year: int) -> bool:
-        return (Validator.PATTERN_YEAR.match(year) is not None) and (min_year <= int(year) <= max_year)
-
-    @staticmethod
-    def validate_height(height: str) -> bool:
-        m = Validator.PATTERN_HEIGHT.match(height)
-        if m is None:
-            return False
-        value = int(m.group(1))
-        unit = m.group(2)
-        if unit == "cm":
-            return Validator.HEIGHT_CM_MIN <= value <= Validator.HEIGHT_CM_MAX
-        else:
-            return Validator.HEIGHT_IN_MIN <= value <= Validator.HEIGHT_IN_MAX
-
-    @staticmethod
-    def validate_id(id_str: str) -> bool:
-        return Validator.validate_pattern(id_str, Validator.PATTERN_ID)
-
-    @staticmethod
-    def validate_pattern(subject: str, pattern: Pattern) -> bool:
-        return pattern.match(subject) is not None
+        return PassportEntry(fields, mask) if len(fields) > 0 else None
 
 
 def load(input_path: str) -> List[PassportEntry]:
-    ret_val: List[PassportEntry] = []
-    buffer: str = ""
-    with open(input_path, 'r') as input_file:
-        for raw_line in input_file:
-            line = raw_line.strip()
-            if len(line) == 0:
-                passport = PassportEntry.parse(buffer)
+    return list(iter_passports(input_path))
+
+
+def iter_records(buffer, start: int = 0, end: int or None = None) -> Iterator[str]:
+    # Yields the raw records from any bytes-like buffer (bytes, mmap, ...) without copying more than one record
+    end = end if end is not None else len(buffer)
+    for separator in RECORD_SEPARATOR.finditer(buffer, start, end):
+        yield buffer[start:separator.start()].decode()
+        start = separator.end()
+    yield buffer[start:end].decode()
+
+
+def iter_passports(input_path: str) -> Iterator[PassportEntry]:
+    with open(input_path, 'rb') as input_file:
+        if input_file.seek(0, 2) == 0:
+            # an empty file can't be mapped
+            return
+        with mmap.mmap(input_file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            for record in iter_records(buffer):
+                passport = PassportEntry.parse(record)
                 if passport is not None:
-                    ret_val.append(passport)
-                buffer = ""
-            else:
-                buffer += " " + line
-    passport = PassportEntry.parse(buffer)
-    if passport is not None:
-        ret_val.append(passport)
+                    yield passport
+
+
+class ValidationReport:
+    # Totals along with per-field histograms of the required fields that were missing or didn't pass validation
+
+    def __init__(self):
+        self.total = 0
+        self.with_all_fields = 0
+        self.valid = 0
+        self.missing: Dict[str, int] = {}
+        self.failed: Dict[str, int] = {}
+
+    def add(self, passport: PassportEntry) -> None:
+        self.total += 1
+        missing, failed = PLAN.failures(passport.fields, passport.mask)
+        for name in missing:
+            self.missing[name] = self.missing.get(name, 0) + 1
+        for name in failed:
+            self.failed[name] = self.failed.get(name, 0) + 1
+        if len(missing) == 0:
+            self.with_all_fields += 1
+            if len(failed) == 0:
+                self.valid += 1
+
+    def merge(self, other: 'ValidationReport') -> 'ValidationReport':
+        self.total += other.total
+        self.with_all_fields += other.with_all_fields
+        self.valid += other.valid
+        for name, cnt in other.missing.items():
+            self.missing[name] = self.missing.get(name, 0) + cnt
+        for name, cnt in other.failed.items():
+            self.failed[name] = self.failed.get(name, 0) + cnt
+        return self
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, ValidationReport) and vars(self) == vars(other)
+
+
+def build_report(passports: Iterable[PassportEntry]) -> ValidationReport:
+    report = ValidationReport()
+    for passport in passports:
+        report.add(passport)
+    return report
+
+
+def split_ranges(input_path: str, parts: int) -> List[Tuple[int, int]]:
+    # Splits the file into (start, end) byte ranges, each of them starting right at the beginning of a record
+    size = os.path.getsize(input_path)
+    boundaries = [0]
+    if size > 0:
+        with open(input_path, 'rb') as input_file, \
+                mmap.mmap(input_file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            for i in range(1, parts):
+                position = max(size * i // parts, boundaries[-1])
+                separator = RECORD_SEPARATOR.search(buffer, position)
+                if separator is None:
+                    break
+                if separator.end() > boundaries[-1]:
+                    boundaries.append(separator.end())
+    if boundaries[-1] < size or len(boundaries) == 1:
+        boundaries.append(size)
+    return [(boundaries[i], boundaries[i + 1]) for i in range(len(boundaries) - 1)]
+
+
+def _report_range(input_path: str, byte_range: Tuple[int, int]) -> ValidationReport:
+    # runs in a worker process - only the report travels back to the parent
+    report = ValidationReport()
+    if byte_range[0] >= byte_range[1]:
+        return report
+    with open(input_path, 'rb') as input_file, \
+            mmap.mmap(input_file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        for record in iter_records(buffer, byte_range[0], byte_range[1]):
+            passport = PassportEntry.parse(record)
+            if passport is not None:
+                report.add(passport)
+    return report
+
+
+def validate_parallel(input_path: str, workers: int or None = None) -> ValidationReport:
+    workers = workers if workers is not None else os.cpu_count()
+    ranges = split_ranges(input_path, workers * RANGES_PER_WORKER)
+    report = ValidationReport()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for partial_report in executor.map(_report_range, repeat(input_path), ranges):
+            report.merge(partial_report)
+    return report
+
+
+def benchmark_parallel(input_path: str, max_workers: int or None = None) -> List[Tuple[int, float]]:
+    max_workers = max_workers if max_workers is not None else os.cpu_count()
+    t = time.perf_counter()
+    expected = build_report(iter_passports(input_path))
+    baseline = time.perf_counter() - t
+    print("workers  seconds  speedup")
+    print("%7s  %7.3f  %7.2f" % ("serial", baseline, 1.0))
+    ret_val: List[Tuple[int, float]] = []
+    workers = 1
+    while True:
+        t = time.perf_counter()
+        report = validate_parallel(input_path, workers)
+        elapsed = time.perf_counter() - t
+        if report != expected:
+            raise RuntimeError("Parallel validation with %d workers doesn't match the serial one" % workers)
+        print("%7d  %7.3f  %7.2f" % (workers, elapsed, baseline / elapsed))
+        ret_val.append((workers, elapsed))
+        if workers >= max_workers:
+            break
+        workers = min(workers * 2, max_workers)
     return ret_val
 
 
-def count_valid_entries(passports: List[PassportEntry]) -> int:
-    return sum([
-        (1 if passport.is_valid() else 0) for passport in passports
-    ])
-
-
-def count_entries_with_all_required_fields(passports: List[PassportEntry]) -> int:
-    return sum([
-        (1 if passport.has_all_required_fields() else 0) for passport in passports
-    ])
-
-
-def main() -> None:
-    passports = load("./input.txt")
-    valid_cnt = count_entries_with_all_required_fields(passports)
-    print("Passports with all fields: %d out of %d" % (valid_cnt, len(passports)))
-
-    valid_cnt = count_valid_entries(passports)
-    print("Valid passports: %d out of %d" % (valid_cnt, len(passports)))
+def count_valid_entries(passports: Iterable[PassportEntry]) -> int:
+    return sum(1 for passport in passports if passport.is_valid())
+
+
+def count_entries_with_all_required_fields(passports: Iterable[PassportEntry]) -> int:
+    return sum(1 for passport in passports if passport.has_all_required_fields())
+
+
+def count_entries(passports: Iterable[PassportEntry]) -> Tuple[int, int, int]:
+    # (all entries, entries with all required fields, valid entries) in a single pass
+    total = 0
+    with_all_fields = 0
+    valid = 0
+    for passport in passports:
+        total += 1
+        if passport.has_all_required_fields():
+            with_all_fields += 1
+            if passport.is_valid():
+                valid += 1
+    return total, with_all_fields, valid
+
+
+def main(argv: List[str] or None = None) -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input", default="./input.txt", help="the passport batch, records separated by blank lines")
+    parser.add_argument("--workers", type=int, default=None, help="validate in this many processes")
+    parser.add_argument("--benchmark", action="store_true", help="measure the speedup for growing worker counts")
+    parser.add_argument("--profile", default=None, help="dump per-field validation statistics into this JSON file")
+    args = parser.parse_args(argv)
+
+    if args.benchmark:
+        benchmark_parallel(args.input, args.workers)
+        return
+
+    if args.profile is not None:
+        # profiling happens in this process only
+        profiler = enable_profiling()
+        report = build_report(iter_passports(args.input))
+        disable_profiling(profiler)
+        profiler.dump(args.profile)
+    elif args.workers is not None:
+        report = validate_parallel(args.input, args.workers)
+    else:
+        report = build_report(iter_passports(args.input))
+    print("Passports with all fields: %d out of %d" % (report.with_all_fields, report.total))
+    print("Valid passports: %d out of %d" % (report.valid, report.total))
+    for field in Fields.REQUIRED:
+        print(
+            "%s: missing %d, failed validation %d" %
+            (field.name, report.missing.get(field.name, 0), report.failed.get(field.name, 0))
+        )
 
 
 if __name__ == "__main__":
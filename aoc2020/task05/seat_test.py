@@ -0,0 +1,54 @@
+import unittest
+
+from aoc2020.task05.task05 import decode_chunk, find_seat, find_seats_by_flight, SeatOccupancy, SeatMap
+
+
+class SeatTest(unittest.TestCase):
+
+    def test_decode(self):
+        self.assertEqual([357, 567, 119, 820], list(decode_chunk(b"FBFBBFFRLR\nBFFFBBFRRR\nFFFBBBFRRR\nBBFFBBFRLL\n")))
+        self.assertEqual([357, 567], list(decode_chunk(b"FBFBBFFRLR\r\nbfffbbfrrr")))
+
+    def test_occupancy(self):
+        passes = [20, 17, 12, 13, 15, 18]
+        occupancy = SeatOccupancy(passes)
+        self.assertEqual(12, occupancy.min_seat())
+        self.assertEqual(20, occupancy.max_seat())
+        self.assertEqual([14, 16, 19], occupancy.gaps())
+        self.assertEqual(14, occupancy.find_seat())
+        self.assertEqual(14, find_seat(passes))
+        occupancy.add(14)
+        self.assertEqual(16, occupancy.find_seat())
+        self.assertIsNone(SeatOccupancy().find_seat())
+        self.assertEqual([20, 17, 12, 13, 15, 18], passes)
+
+    def test_first_and_last_row(self):
+        # the seats in the first and the last row are never ours
+        self.assertIsNone(find_seat([0, 2]))
+        self.assertEqual(8, find_seat([9]))
+        self.assertIsNone(find_seat([1014, 1016]))
+
+    def test_flights(self):
+        passes = [(flight, seat_id) for flight in ["a", "b"] for seat_id in range(100, 110) if seat_id != 105]
+        passes.append(("c", 300))
+        self.assertEqual({"a": 105, "b": 105, "c": None}, find_seats_by_flight(passes))
+
+    def test_seat_map(self):
+        seat_map = SeatMap([0, 1, 2, 4])
+        self.assertFalse(seat_map.is_free(1))
+        self.assertTrue(seat_map.is_free(3))
+        self.assertEqual(3, seat_map.next_free())
+        seat_map.add(3)
+        self.assertEqual(5, seat_map.next_free())
+        for seat_id in range(5, 24):
+            seat_map.add(seat_id)
+        self.assertEqual(24, seat_map.next_free(7))
+        self.assertEqual(30, seat_map.next_free(30))
+        self.assertIsNone(SeatMap(range(1024)).next_free())
+        self.assertIsNone(seat_map.find_seat())
+        seat_map.add(25)
+        self.assertEqual(24, seat_map.find_seat())
+
+
+if __name__ == '__main__':
+    unittest.main()
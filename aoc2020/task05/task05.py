@@ -1,43 +1,199 @@
-from typing import List
+from array import array
+from itertools import repeat
+from typing import List, Sequence, Iterable, Tuple, Dict, Hashable
 
+try:
+    import numpy
+except ImportError:
+    # numpy is optional - the pure python decoder works on whole chunks too
+    numpy = None
 
-def load(input_path: str) -> List[int]:
-    ret_val = []
-    with open(input_path, 'r') as input_file:
-        for line in input_file:
-            bin_str = binarize_str(line)
-            val = int(bin_str, 2)
-            ret_val.append(val)
+CHUNK_BYTES = 1 << 20
+BINARY = bytes.maketrans(b"FBLRfblr", b"01010101")
+PASS_LENGTH = 10
+ROW_SEATS = 8
+ROWS = 1 << (PASS_LENGTH - 3)
+SEATS = ROWS * ROW_SEATS
+FREE = ord("0")
+OCCUPIED = ord("1")
+# the first and the last row are skipped when looking for our seat
+SEARCH_WINDOW = ((1 << (SEATS - ROW_SEATS - 1)) - 1) & ~((1 << ROW_SEATS) - 1)
+
+
+def load(input_path: str) -> array:
+    # Decodes whole chunks of the file at once into an array('H') of seat ids
+    ret_val = array('H')
+    with open(input_path, 'rb') as input_file:
+        while True:
+            chunk = input_file.read(CHUNK_BYTES)
+            if not chunk:
+                break
+            # finish the last line, so that no pass is split between two chunks
+            chunk += input_file.readline()
+            ret_val.extend(decode_chunk(chunk))
     return ret_val
 
 
+def decode_chunk(chunk: bytes) -> Sequence[int]:
+    binary = chunk.translate(BINARY)
+    if numpy is not None:
+        seat_ids = _decode_fixed_width(binary)
+        if seat_ids is not None:
+            return seat_ids
+    return array('H', map(int, binary.split(), repeat(2)))
+
+
+def _decode_fixed_width(binary: bytes) -> array or None:
+    # With every line being exactly 10 digits and a line break, the chunk is a (n, 11) matrix of bytes
+    # and the seat ids are a single matrix-vector product. Anything else is left to the generic path.
+    if not binary.endswith(b"\n"):
+        binary += b"\n"
+    if len(binary) % (PASS_LENGTH + 1) != 0:
+        return None
+    records = numpy.frombuffer(binary, dtype=numpy.uint8).reshape(-1, PASS_LENGTH + 1)
+    if not (records[:, PASS_LENGTH] == ord("\n")).all():
+        return None
+    bits = records[:, :PASS_LENGTH] - numpy.uint8(ord("0"))
+    if (bits > 1).any():
+        return None
+    weights = 1 << numpy.arange(PASS_LENGTH - 1, -1, -1, dtype=numpy.uint16)
+    return array('H', (bits.astype(numpy.uint16) @ weights).astype(numpy.uint16).tobytes())
+
+
 def binarize_str(raw: str) -> str:
     return raw.strip().upper().replace("F", "0").replace("B", "1").replace("L", "0").replace("R", "1")
 
 
-def find_seat(passes: List[int]) -> int or None:
-    passes.sort()
-    prev = 7
-    for i in range(len(passes)):
-        curr = passes[i]
-        # check the row number - we know we can skip the first and the last row
-        r = curr // 8
-        if r == 0:
-            continue
-        if r == 127:
+class SeatOccupancy:
+    # The whole 10-bit seat space of a plane as a single int, bit i is set when seat i is taken.
+    # Min, max and the gaps are then a handful of bit operations instead of sorting the passes.
+
+    __slots__ = ("bits",)
+
+    def __init__(self, passes: Iterable[int] = ()):
+        marks = bytearray([FREE]) * SEATS
+        for seat_id in passes:
+            marks[seat_id] = OCCUPIED
+        # the highest seat id goes first in the binary literal
+        marks.reverse()
+        self.bits = int(marks, 2)
+
+    def add(self, seat_id: int) -> None:
+        self.bits |= 1 << seat_id
+
+    def is_occupied(self, seat_id: int) -> bool:
+        return (self.bits >> seat_id) & 1 == 1
+
+    def min_seat(self) -> int or None:
+        return (self.bits & -self.bits).bit_length() - 1 if self.bits else None
+
+    def max_seat(self) -> int or None:
+        return self.bits.bit_length() - 1 if self.bits else None
+
+    def gaps(self) -> List[int]:
+        # all the free seats between the lowest and the highest taken one
+        if not self.bits:
+            return []
+        lowest = self.min_seat()
+        window = ((1 << self.max_seat()) - 1) & ~((1 << (lowest + 1)) - 1)
+        return _set_bits(~self.bits & window)
+
+    def find_seat(self) -> int or None:
+        # The first free seat with both neighbours taken, outside the first and the last row. The seat right before
+        # the second row counts as taken - that's where the search starts.
+        taken_before = (self.bits | (1 << (ROW_SEATS - 1))) << 1
+        taken_after = self.bits >> 1
+        candidates = ~self.bits & taken_before & taken_after & SEARCH_WINDOW
+        return (candidates & -candidates).bit_length() - 1 if candidates else None
+
+
+def _set_bits(bits: int) -> List[int]:
+    ret_val: List[int] = []
+    while bits:
+        lowest = bits & -bits
+        ret_val.append(lowest.bit_length() - 1)
+        bits ^= lowest
+    return ret_val
+
+
+class SeatMap:
+    # Live view of a plane while the passes are being scanned. Next to the occupancy bitset every row keeps
+    # an 8-bit mask of its free seats, and one more bitset tells which rows have any free seat left.
+    # So adding a pass, checking a seat and finding the next free seat are all constant time.
+
+    __slots__ = ("occupancy", "row_free", "rows_with_free")
+
+    ROW_MASK = (1 << ROW_SEATS) - 1
+
+    def __init__(self, passes: Iterable[int] = ()):
+        self.occupancy = SeatOccupancy(passes)
+        bits = self.occupancy.bits
+        self.row_free: List[int] = [
+            ~(bits >> (row * ROW_SEATS)) & SeatMap.ROW_MASK for row in range(ROWS)
+        ]
+        self.rows_with_free = 0
+        for row in range(ROWS):
+            if self.row_free[row]:
+                self.rows_with_free |= 1 << row
+
+    def add(self, seat_id: int) -> None:
+        self.occupancy.add(seat_id)
+        row = seat_id // ROW_SEATS
+        self.row_free[row] &= ~(1 << (seat_id % ROW_SEATS))
+        if not self.row_free[row]:
+            self.rows_with_free &= ~(1 << row)
+
+    def is_free(self, seat_id: int) -> bool:
+        return not self.occupancy.is_occupied(seat_id)
+
+    def next_free(self, seat_id: int = 0) -> int or None:
+        # the lowest free seat id >= seat_id
+        row = seat_id // ROW_SEATS
+        if row >= ROWS:
             return None
-        if curr - prev == 2:
-            return curr - 1
-        prev = curr
-    return None
+        free = self.row_free[row] & (SeatMap.ROW_MASK << (seat_id % ROW_SEATS))
+        if not free:
+            later_rows = self.rows_with_free >> (row + 1)
+            if not later_rows:
+                return None
+            row += (later_rows & -later_rows).bit_length()
+            free = self.row_free[row]
+        return row * ROW_SEATS + (free & -free).bit_length() - 1
+
+    def find_seat(self) -> int or None:
+        return self.occupancy.find_seat()
+
+
+def find_seat(passes: Iterable[int]) -> int or None:
+    return SeatOccupancy(passes).find_seat()
+
+
+def occupancy_by_flight(passes: Iterable[Tuple[Hashable, int]]) -> Dict[Hashable, SeatOccupancy]:
+    # (flight, seat id) pairs in any order - every flight gets its own occupancy
+    marks: Dict[Hashable, bytearray] = {}
+    for flight, seat_id in passes:
+        flight_marks = marks.get(flight)
+        if flight_marks is None:
+            flight_marks = bytearray([FREE]) * SEATS
+            marks[flight] = flight_marks
+        flight_marks[seat_id] = OCCUPIED
+    ret_val: Dict[Hashable, SeatOccupancy] = {}
+    for flight, flight_marks in marks.items():
+        occupancy = SeatOccupancy()
+        flight_marks.reverse()
+        occupancy.bits = int(flight_marks, 2)
+        ret_val[flight] = occupancy
+    return ret_val
+
+
+def find_seats_by_flight(passes: Iterable[Tuple[Hashable, int]]) -> Dict[Hashable, int or None]:
+    return {flight: occupancy.find_seat() for flight, occupancy in occupancy_by_flight(passes).items()}
 
 
 def main() -> None:
-    passes = load("./input.txt")
-    passes.sort()
-    highest = passes[-1]
-    print("Highest seat id: %d" % highest)
-    found = find_seat(passes)
+    occupancy = SeatOccupancy(load("./input.txt"))
+    print("Highest seat id: %d" % occupancy.max_seat())
+    found = occupancy.find_seat()
     print("Found empty seat: %s" % str(found))
 
 
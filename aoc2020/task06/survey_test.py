@@ -0,0 +1,64 @@
+import itertools
+import os
+import random
+import tempfile
+import unittest
+
+from aoc2020.task06.task06 import load_join, load_intersection, sum_groups, aggregate_lines, Aggregate, Union, Intersection, AtLeast, Histogram
+
+EXAMPLE = "abc\n\na\nb\nc\n\nab\nac\n\na\na\na\na\n\nb\n"
+
+
+class SurveyTest(unittest.TestCase):
+
+    def test_example(self):
+        lines = EXAMPLE.splitlines(keepends=True)
+        self.assertEqual([11, 6, 11, 2], aggregate_lines(lines, [Union(), Intersection(), AtLeast(1), AtLeast(2)]))
+
+    def test_load(self):
+        # blank lines before the first group and several of them in a row don't make empty groups
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        for i, content in enumerate([EXAMPLE, "\n" + EXAMPLE, "\n\n" + EXAMPLE.replace("\n\n", "\n \n\n") + "\n"]):
+            path = os.path.join(tmp_dir.name, "input_%d.txt" % i)
+            with open(path, 'w') as f:
+                f.write(content)
+            self.assertEqual(5, len(load_join(path)))
+            self.assertEqual(11, sum_groups(load_join(path)))
+            self.assertEqual(5, len(load_intersection(path)))
+            self.assertEqual(6, sum_groups(load_intersection(path)))
+
+    def test_against_sets(self):
+        # every aggregate against the same computation over plain sets, all of them in a single pass
+        rnd = random.Random(6)
+        questions = "abcdxyz"
+        for _ in range(300):
+            groups = [
+                [set(rnd.sample(questions, rnd.randint(1, len(questions)))) for _ in range(rnd.randint(1, 6))]
+                for _ in range(rnd.randint(0, 6))
+            ]
+            lines = list(itertools.chain.from_iterable(["".join(sorted(m)) + "\n" for m in g] + ["\n"] for g in groups))
+            if lines and rnd.random() < 0.5:
+                # no blank line after the last group
+                lines.pop()
+
+            ks = [1, 2, 3, 6]
+            found = aggregate_lines(lines, [Union(), Intersection(), Histogram()] + [AtLeast(k) for k in ks])
+            self.assertEqual(sum(len(set.union(*g)) for g in groups), found[0])
+            self.assertEqual(sum(len(set.intersection(*g)) for g in groups), found[1])
+            histogram = {chr(c): 0 for c in range(ord("a"), ord("z") + 1)}
+            for member in itertools.chain.from_iterable(groups):
+                for question in member:
+                    histogram[question] += 1
+            self.assertEqual(histogram, found[2])
+            for k, total in zip(ks, found[3:]):
+                expected = sum(sum(1 for q in questions if sum(q in m for m in g) >= k) for g in groups)
+                self.assertEqual(expected, total)
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, AtLeast, 0)
+        self.assertRaises(TypeError, Aggregate)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,31 +1,41 @@
-from typing import List, Callable
+import operator
+from abc import ABC, abstractmethod
+from typing import List, Callable, Dict, Tuple, Iterable
+
+# every question "a" - "z" has its own bit
+QUESTION_BITS: Dict[str, int] = {chr(i): 1 << (i - ord("a")) for i in range(ord("a"), ord("z") + 1)}
 
 
 class Group:
+    __slots__ = ("positive_questions",)
+
     def __init__(self):
-        self.positive_questions: List[bool] or None = None
+        # bitmask of the questions, None until the first member of the group has been read
+        self.positive_questions: int or None = None
+
 
+def answers(line: str) -> int:
+    mask = 0
+    for char in set(line):
+        mask |= QUESTION_BITS.get(char, 0)
+    return mask
 
-def _load(input_path: str, combiner_fn: Callable[[bool, bool], bool]) -> List[Group]:
+
+def _load(input_path: str, combiner_fn: Callable[[int, int], int]) -> List[Group]:
     ret_val: List[Group] = []
-    rng = range(ord("a"), ord("z") + 1)
-    a = ord("a")
     grp = Group()
     with open(input_path, 'r') as input_file:
         for raw_line in input_file:
             line = raw_line.strip().lower()
-            if (line == "") and (len(grp.positive_questions) > 0):
-                ret_val.append(grp)
-                grp = Group()
+            if line == "":
+                if grp.positive_questions is not None:
+                    ret_val.append(grp)
+                    grp = Group()
             elif grp.positive_questions is None:
-                grp.positive_questions = [
-                    (chr(i) in line) for i in rng
-                ]
+                grp.positive_questions = answers(line)
             else:
-                grp.positive_questions = [
-                    combiner_fn(grp.positive_questions[i - a], chr(i) in line) for i in rng
-                ]
-    if len(grp.positive_questions) > 0:
+                grp.positive_questions = combiner_fn(grp.positive_questions, answers(line))
+    if grp.positive_questions is not None:
         ret_val.append(grp)
     return ret_val
 
@@ -33,31 +43,135 @@ def _load(input_path: str, combiner_fn: Callable[[bool, bool], bool]) -> List[Gr
 def load_join(input_path: str) -> List[Group]:
     return _load(
         input_path=input_path,
-        combiner_fn=lambda b1, b2: b1 or b2)
+        combiner_fn=operator.or_)
 
 
 def load_intersection(input_path: str) -> List[Group]:
     return _load(
         input_path=input_path,
-        combiner_fn=lambda b1, b2: b1 and b2)
+        combiner_fn=operator.and_)
 
 
 def sum_groups(groups: List[Group]) -> int:
-    return sum(
-        [sum(
-            [1 if a else 0 for a in grp.positive_questions]
-        ) for grp in groups]
-    )
+    return sum(grp.positive_questions.bit_count() for grp in groups)
 
 
-def main() -> None:
-    groups = load_join("./input.txt")
-    total_positive_questions = sum_groups(groups)
-    print("Sum of joins: %d" % total_positive_questions)
+class Aggregate(ABC):
+    # Folds the groups one by one into a running result, so that nothing but the current group is kept in memory
+
+    @abstractmethod
+    def add_group(self, members: List[int]) -> None:
+        pass
+
+    @abstractmethod
+    def result(self):
+        pass
+
+
+class Union(Aggregate):
+    # questions anybody in the group answered "yes" to
+
+    def __init__(self):
+        self.total = 0
+
+    def add_group(self, members: List[int]) -> None:
+        mask = 0
+        for member in members:
+            mask |= member
+        self.total += mask.bit_count()
+
+    def result(self) -> int:
+        return self.total
+
+
+class Intersection(Aggregate):
+    # questions everybody in the group answered "yes" to
+
+    def __init__(self):
+        self.total = 0
+
+    def add_group(self, members: List[int]) -> None:
+        mask = members[0]
+        for member in members:
+            mask &= member
+        self.total += mask.bit_count()
+
+    def result(self) -> int:
+        return self.total
+
 
-    groups = load_intersection("./input.txt")
-    total_positive_questions = sum_groups(groups)
-    print("Sum of intersections: %d" % total_positive_questions)
+class AtLeast(Aggregate):
+    # questions at least k members of the group answered "yes" to
+
+    def __init__(self, k: int):
+        if k < 1:
+            raise ValueError("At least one member has to answer, received k=%d" % k)
+        self.k = k
+        self.total = 0
+
+    def add_group(self, members: List[int]) -> None:
+        if len(members) < self.k:
+            return
+        # levels[j] holds the questions answered by more than j of the members seen so far
+        levels = [0] * self.k
+        for member in members:
+            for j in range(self.k - 1, 0, -1):
+                levels[j] |= levels[j - 1] & member
+            levels[0] |= member
+        self.total += levels[-1].bit_count()
+
+    def result(self) -> int:
+        return self.total
+
+
+class Histogram(Aggregate):
+    # for every question the number of people who answered "yes" to it
+
+    def __init__(self):
+        self.counts: List[int] = [0] * len(QUESTION_BITS)
+
+    def add_group(self, members: List[int]) -> None:
+        for member in members:
+            while member:
+                lowest = member & -member
+                self.counts[lowest.bit_length() - 1] += 1
+                member ^= lowest
+
+    def result(self) -> Dict[str, int]:
+        return {question: self.counts[bit.bit_length() - 1] for question, bit in QUESTION_BITS.items()}
+
+
+def aggregate_lines(lines: Iterable[str], aggregates: List[Aggregate]) -> list:
+    members: List[int] = []
+    for raw_line in lines:
+        line = raw_line.strip().lower()
+        if line != "":
+            members.append(answers(line))
+        elif len(members) > 0:
+            for agg in aggregates:
+                agg.add_group(members)
+            members = []
+    if len(members) > 0:
+        for agg in aggregates:
+            agg.add_group(members)
+    return [agg.result() for agg in aggregates]
+
+
+def aggregate(input_path: str, aggregates: List[Aggregate]) -> list:
+    # all the aggregates in a single pass over the file - the results come in the order of the aggregates
+    with open(input_path, 'r') as input_file:
+        return aggregate_lines(input_file, aggregates)
+
+
+def sum_join_and_intersection(input_path: str) -> Tuple[int, int]:
+    total_join, total_intersection = aggregate(input_path, [Union(), Intersection()])
+    return total_join, total_intersection
+
+
+def main() -> None:
+    total_join, total_intersection = sum_join_and_intersection("./input.txt")
+    print("Sum of joins: %d" % total_join)
+    print("Sum of intersections: %d" % total_intersection)
 
 
 if __name__ == "__main__":
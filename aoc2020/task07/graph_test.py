@@ -1,6 +1,12 @@
 import unittest
 
-from aoc2020.task07.task07 import load, Graph, Bag, Child
+import os
+import random
+import shutil
+import tempfile
+
+from aoc2020.task07.task07 import load, load_compact, parse_rules, Graph, CompactGraph, ColorTable, Bag, Child, \
+    SNAPSHOT_SUFFIX
 
 
 class MyTestCase(unittest.TestCase):
@@ -47,6 +53,20 @@ class MyTestCase(unittest.TestCase):
         self.assertEqual(1, len(graph.graph_map['grandchild b'].parents))
         self.assertEqual(graph.graph_map['grandchild b'].parents['child'], graph.graph_map['child'])
 
+    def test_from_rules(self):
+        rules = [('child', [(1, 'grandchild')]), ('orphan', []), ('root', [(2, 'child')]), ('other root', [(1, 'child')]),
+                 ('orphan', [(1, 'grandchild')])]
+        graph = Graph()
+        for node_color, children in rules:
+            graph.add_node(node_color, children)
+        bulk_graph = Graph.from_rules(rules)
+        self.assertEqual(['orphan', 'root', 'other root'], graph.root_colors)
+        self.assertEqual(graph.root_colors, bulk_graph.root_colors)
+        self.assertEqual(graph.graph_map.keys(), bulk_graph.graph_map.keys())
+        # a former root stops being one once it gets a parent
+        bulk_graph.add_node('super root', [(1, 'root')])
+        self.assertEqual(['orphan', 'other root', 'super root'], bulk_graph.root_colors)
+
     def test_count_parents(self):
         simple_graph = load("./simple_graph.txt")
         self.assertEqual(4, len(simple_graph.count_all_parents_for('shiny gold')))
@@ -55,6 +75,141 @@ class MyTestCase(unittest.TestCase):
         simple_graph = load("./simple_graph.txt")
         self.assertEqual(32, simple_graph.count_needed_other_bags_for('shiny gold'))
 
+    def test_deep_shared_graph(self):
+        # a ladder of diamonds - every level is reachable from the top over 2^n paths and is deeper than
+        # the default recursion limit
+        graph = Graph()
+        depth = 500
+        for level in range(depth):
+            graph.add_node('top %d' % level, [(1, 'left %d' % level), (1, 'right %d' % level)])
+            graph.add_node('left %d' % level, [(1, 'top %d' % (level + 1))])
+            graph.add_node('right %d' % level, [(1, 'top %d' % (level + 1))])
+        self.assertEqual(3 * depth, len(graph.count_all_parents_for('top %d' % depth)))
+        self.assertEqual(set(), graph.count_all_parents_for('top 0'))
+        self.assertEqual(5, graph.count_needed_bags_for('top %d' % (depth - 1)))
+        self.assertEqual(2 ** 12 - 3, graph.count_needed_bags_for('top %d' % (depth - 10)))
+
+    def test_cache_invalidation(self):
+        graph = Graph()
+        graph.add_node('root', [(2, 'child')])
+        self.assertEqual({'root'}, graph.count_all_parents_for('child'))
+        self.assertEqual(2, graph.count_needed_other_bags_for('root'))
+        # the returned set must not leak into the cache
+        graph.count_all_parents_for('child').add('intruder')
+        self.assertEqual({'root'}, graph.count_all_parents_for('child'))
+
+        graph.add_node('child', [(3, 'grandchild')])
+        graph.add_node('super root', [(1, 'root')])
+        self.assertEqual({'root', 'super root'}, graph.count_all_parents_for('child'))
+        self.assertEqual(8, graph.count_needed_other_bags_for('root'))
+        self.assertEqual(9, graph.count_needed_other_bags_for('super root'))
+
+    def test_loop(self):
+        graph = Graph()
+        graph.add_node('a', [(1, 'b')])
+        graph.add_node('b', [(1, 'c')])
+        graph.add_node('c', [(1, 'b')])
+        self.assertRaises(ValueError, graph.count_all_parents_for, 'c')
+        self.assertRaises(ValueError, graph.count_needed_bags_for, 'a')
+
+    def test_compact_graph(self):
+        compact_graph = load_compact("./simple_graph.txt", use_snapshot=False)
+        self.assertEqual(4, len(compact_graph.count_all_parents_for('shiny gold')))
+        self.assertEqual(32, compact_graph.count_needed_other_bags_for('shiny gold'))
+        self.assertEqual(load("./simple_graph.txt").root_colors, compact_graph.root_colors)
+        self.assertRaises(KeyError, compact_graph.count_needed_bags_for, 'plaid unicorn')
+
+    def test_compact_graph_matches_graph(self):
+        rnd = random.Random(7)
+        rules = []
+        for _ in range(300):
+            # colors may come back with another rule, as may children within a single rule
+            node = rnd.randrange(60)
+            children = [(rnd.randint(1, 4), 'color %d' % rnd.randrange(node + 1, 61)) for _ in range(rnd.randrange(4))]
+            rules.append(('color %d' % node, children))
+        graph = Graph()
+        for node_color, children in rules:
+            graph.add_node(node_color, children)
+        compact_graph = CompactGraph.from_rules(rules)
+        self.assertEqual(sorted(set(graph.root_colors)), sorted(compact_graph.root_colors))
+        for color in graph.graph_map.keys():
+            self.assertEqual(graph.count_all_parents_for(color), compact_graph.count_all_parents_for(color))
+            self.assertEqual(graph.count_needed_bags_for(color), compact_graph.count_needed_bags_for(color))
+
+    def test_compact_graph_loop(self):
+        compact_graph = CompactGraph.from_rules([('a', [(1, 'b')]), ('b', [(1, 'c')]), ('c', [(1, 'b')])])
+        self.assertRaises(ValueError, compact_graph.count_all_parents_for, 'c')
+        self.assertRaises(ValueError, compact_graph.count_needed_bags_for, 'a')
+
+    def test_many(self):
+        graph = load("./simple_graph.txt")
+        compact_graph = load_compact("./simple_graph.txt", use_snapshot=False)
+        colors = ['shiny gold', 'bright white', 'faded blue', 'light red', 'shiny gold']
+        expected_ancestors = {color: load("./simple_graph.txt").count_all_parents_for(color) for color in colors}
+        expected_counts = {color: load("./simple_graph.txt").count_needed_other_bags_for(color) for color in colors}
+        for g in (graph, compact_graph):
+            self.assertEqual(expected_ancestors, g.ancestors_many(colors))
+            self.assertEqual(expected_counts, g.descendant_counts_many(colors))
+        self.assertEqual({'light red', 'dark orange'}, compact_graph.ancestors_many(['bright white'])['bright white'])
+        self.assertEqual({}, compact_graph.ancestors_many([]))
+
+        # a chain deeper than the recursion limit, with queries on top of each other
+        chain = Graph.from_rules(('link %d' % i, [(1, 'link %d' % (i + 1))]) for i in range(3000))
+        ancestors = chain.ancestors_many(['link 3000', 'link 10', 'link 0'])
+        self.assertEqual(3000, len(ancestors['link 3000']))
+        self.assertEqual({'link %d' % i for i in range(10)}, ancestors['link 10'])
+        self.assertEqual(set(), ancestors['link 0'])
+
+    def test_snapshot(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            input_path = os.path.join(tmp_dir, "rules.txt")
+            shutil.copyfile("./simple_graph.txt", input_path)
+            parsed = load_compact(input_path)
+            self.assertTrue(os.path.exists(input_path + SNAPSHOT_SUFFIX))
+            mapped = load_compact(input_path)
+            self.assertIsInstance(mapped.colors, ColorTable)
+            self.assertEqual(list(parsed.colors), list(mapped.colors))
+            self.assertEqual(parsed.root_colors, mapped.root_colors)
+            self.assertEqual(list(parsed.topological_order), list(mapped.topological_order))
+            self.assertEqual(4, len(mapped.count_all_parents_for('shiny gold')))
+            self.assertEqual(32, mapped.count_needed_other_bags_for('shiny gold'))
+            self.assertRaises(KeyError, mapped.count_needed_bags_for, 'plaid unicorn')
+            # the batch queries sweep the stored topological order
+            graph = load(input_path)
+            colors = list(graph.graph_map.keys())
+            self.assertEqual(graph.ancestors_many(colors), mapped.ancestors_many(colors))
+            self.assertEqual(graph.descendant_counts_many(colors[:2]), mapped.descendant_counts_many(colors[:2]))
+
+            # changed rules make the snapshot stale
+            with open(input_path, 'a') as input_file:
+                input_file.write("\nplaid unicorn bags contain 2 light red bags.\n")
+            rebuilt = load_compact(input_path)
+            self.assertNotIsInstance(rebuilt.colors, ColorTable)
+            self.assertEqual(['dark orange', 'plaid unicorn'], rebuilt.root_colors)
+            self.assertEqual(5, len(rebuilt.count_all_parents_for('shiny gold')))
+            self.assertEqual(rebuilt.root_colors, load_compact(input_path).root_colors)
+
+    def test_snapshot_with_loop(self):
+        # a loop doesn't stop the graph from loading, only the queries running into it fail
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            input_path = os.path.join(tmp_dir, "rules.txt")
+            with open(input_path, 'w') as input_file:
+                input_file.write("light red bags contain 1 dark orange bag.\n")
+                input_file.write("dark orange bags contain 1 light red bag.\n")
+                input_file.write("shiny gold bags contain 2 faded blue bags.\n")
+            for compact_graph in (load_compact(input_path), load_compact(input_path)):
+                self.assertEqual(2, compact_graph.count_needed_other_bags_for('shiny gold'))
+                self.assertEqual({'shiny gold': 2}, compact_graph.descendant_counts_many(['shiny gold']))
+                self.assertEqual({'shiny gold'}, compact_graph.count_all_parents_for('faded blue'))
+                self.assertRaises(ValueError, compact_graph.count_needed_bags_for, 'light red')
+            self.assertIsInstance(compact_graph.colors, ColorTable)
+
+    def test_parse_rules(self):
+        rules = list(parse_rules("./simple_graph.txt"))
+        self.assertEqual(('light red', [(1, 'bright white'), (2, 'muted yellow')]), rules[0])
+        # leaf rules don't match PATTERN_BAG_RULE - the leaves only come in as children
+        self.assertEqual(7, len(rules))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,5 +1,13 @@
+import argparse
+import hashlib
+import mmap
+import os
 import re
-from typing import List, Dict, Tuple, Set
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from typing import List, Dict, Tuple, Set, Iterable, Callable, Iterator, Sequence
 
 # We're gonna traverse some graphs this time!!!! :-)
 
@@ -19,6 +27,14 @@ PATTERN_CHILD = re.compile(
     "(?P<" + GRP_NAME_CHILD_OCCURRENCES + ">\\d+)\\s*(?P<" + GRP_NAME_CHILD_COLOR + ">[a-z][a-z\\s]*)\\s+bags?"
 )
 
+# compact graphs are snapshotted next to the rules, the header remembers the hash of the rules it was built from
+SNAPSHOT_SUFFIX = ".csr"
+SNAPSHOT_MAGIC = b"AOCCSR" + (b"LE" if sys.byteorder == "little" else b"BE")
+# magic, sha256 of the rules, number of nodes, edges, roots, nodes in the topological order (none when the rules
+# contain a loop) and bytes of the color table
+SNAPSHOT_HEADER = struct.Struct("=8s32sqqqqq")
+HASH_CHUNK_BYTES = 1 << 20
+
 
 class Bag:
 
@@ -36,14 +52,19 @@ class Child:
 
 class Graph:
     def __init__(self):
-        self.root_colors: List[str] = []
+        # nodes without any parents in the order they became roots - a dict serves as an ordered set
+        self._roots: Dict[str, None] = dict()
         self.graph_map: Dict[str, Bag] = dict()
+        # bag counts per node, dropped whenever the graph changes
+        self._bag_counts: Dict[str, int] = dict()
 
     def add_node(self, node_color: str, children=None) -> None:
         if children is None:
             # for some reason, PEP likes it more like this
             children = []
 
+        self._bag_counts.clear()
+
         # Check whether we've already came across this bag color, or whether it's a new one
         node: Bag
         if node_color in self.graph_map.keys():
@@ -65,64 +86,407 @@ class Graph:
                 self.graph_map[child_color] = child_bag
             # Link the child object with it's new parent
             child_bag.parents[node_color] = node
+            self._roots.pop(child_color, None)
             node.children[child_color] = Child(occurrences=child_occurrences, bag=child_bag)
 
-        # Update this graph's roots
-        # (since some of the current root nodes might have become children of the newly added node)
-        new_roots: List[str] = []
-        for root_candidate in self.root_colors:
-            r = self.graph_map[root_candidate]
-            if len(r.parents) == 0:
-                new_roots.append(root_candidate)
+        # A node only ever gains parents, so it's a root just until its in-degree leaves zero
         if len(node.parents) == 0:
-            new_roots.append(node.color)
-        self.root_colors = new_roots
-
-    def count_all_parents_for(self, node_color: str, visited_nodes: List[str] = None) -> Set[str]:
-        ret_val = set()
-        if node_color in self.root_colors:
-            # root has no parents - we're done
-            return ret_val
-
-        if visited_nodes is None:
-            visited_nodes = []
-        elif node_color in visited_nodes:
-            raise ValueError("You lead me into a loop, you bastard!!!")
-        visited_nodes.append(node_color)
-
-        node = self.graph_map[node_color]
-        for parent_color in node.parents.keys():
-            ret_val.add(parent_color)
-            # time to dive into recursion
-            grandparents = self.count_all_parents_for(parent_color, visited_nodes[:])
-            ret_val.update(grandparents)
-        return ret_val
+            self._roots.setdefault(node_color)
+
+    @staticmethod
+    def from_rules(rules: Iterable[Tuple[str, List[Tuple[int, str]]]]) -> 'Graph':
+        graph = Graph()
+        for node_color, children in rules:
+            graph.add_node(node_color, children)
+        return graph
+
+    @property
+    def root_colors(self) -> List[str]:
+        return list(self._roots.keys())
+
+    def _resolve(self, node_color: str, successors: Callable[[str], Iterable[str]], cache: Dict,
+                 combine: Callable[[str], object]):
+        self._resolve_many([node_color], successors, cache, combine)
+        return cache[node_color]
+
+    def _resolve_many(self, node_colors: Iterable[str], successors: Callable[[str], Iterable[str]], cache: Dict,
+                      combine: Callable[[str], object]) -> None:
+        # Iterative depth-first walk - every node gets combined only after all of its successors have been cached,
+        # i.e. the nodes are resolved in topological order and each of them only once, however many sources share it
+        for node_color in node_colors:
+            if node_color in cache:
+                continue
+            in_progress: Set[str] = {node_color}
+            stack = [(node_color, iter(successors(node_color)))]
+            while stack:
+                color, pending = stack[-1]
+                for successor in pending:
+                    if successor in cache:
+                        continue
+                    if successor in in_progress:
+                        raise ValueError("You lead me into a loop, you bastard!!!")
+                    in_progress.add(successor)
+                    stack.append((successor, iter(successors(successor))))
+                    break
+                else:
+                    stack.pop()
+                    in_progress.discard(color)
+                    cache[color] = combine(color)
+
+    def _parent_colors(self, node_color: str) -> Iterable[str]:
+        return self.graph_map[node_color].parents.keys()
+
+    def _child_colors(self, node_color: str) -> Iterable[str]:
+        return self.graph_map[node_color].children.keys()
+
+    def _combine_bag_count(self, node_color: str) -> int:
+        total = 1
+        for child_color, child in self.graph_map[node_color].children.items():
+            total += child.occurrences * self._bag_counts[child_color]
+        return total
+
+    def count_all_parents_for(self, node_color: str) -> Set[str]:
+        # a single walk up the parents - the ancestor sets aren't memoized, one per node would grow with the depth
+        visited: Dict[str, None] = dict()
+        self._resolve(node_color, self._parent_colors, visited, lambda color: None)
+        del visited[node_color]
+        return set(visited.keys())
 
     def count_needed_other_bags_for(self, node_color: str) -> int:
         return self.count_needed_bags_for(node_color) - 1
 
-    def count_needed_bags_for(self, node_color: str, visited_nodes: List[str] = None) -> int:
-        total = 1
-        node = self.graph_map[node_color]
-        if len(node.children) == 0:
-            # leaves have no children - we're done
-            return total
-        if visited_nodes is None:
-            visited_nodes = []
-        elif node_color in visited_nodes:
-            raise ValueError("You lead me into a loop, you bastard!!!")
-
-        for child_color in node.children.keys():
-            child = node.children[child_color]
-            # time to dive into recursion
-            childs_total = self.count_needed_bags_for(child_color, visited_nodes[:])
-            total += (child.occurrences * childs_total)
+    def count_needed_bags_for(self, node_color: str) -> int:
+        return self._resolve(node_color, self._child_colors, self._bag_counts, self._combine_bag_count)
 
-        return total
+    def ancestors_many(self, node_colors: Iterable[str]) -> Dict[str, Set[str]]:
+        node_colors = list(node_colors)
+        # a single walk up from all of the nodes lists every node after its parents, backwards it's the sweep order
+        visited: Dict[str, None] = dict()
+        self._resolve_many(node_colors, self._parent_colors, visited, lambda color: None)
+        ancestors = _sweep_ancestors(node_colors, reversed(visited.keys()), self._parent_colors)
+        return dict(zip(node_colors, ancestors))
 
+    def descendant_counts_many(self, node_colors: Iterable[str]) -> Dict[str, int]:
+        # bags needed inside each of the bags, e.g. count_needed_other_bags_for of every color
+        node_colors = list(node_colors)
+        self._resolve_many(node_colors, self._child_colors, self._bag_counts, self._combine_bag_count)
+        return {node_color: self._bag_counts[node_color] - 1 for node_color in node_colors}
 
-def load(input_path: str) -> Graph or None:
-    graph = Graph()
+
+class CompactGraph:
+    # Read-only variant of the Graph for really big rule sets - colors are interned to int IDs (in the order of their
+    # first appearance) and both the edges to the children and to the parents are kept in CSR form, e.g. the edges of
+    # the node i are targets[offsets[i]:offsets[i + 1]]
+
+    def __init__(self, colors: Sequence[str], child_offsets: Sequence[int], child_targets: Sequence[int],
+                 child_weights: Sequence[int], parent_offsets: Sequence[int] = None,
+                 parent_targets: Sequence[int] = None, sorted_ids: Sequence[int] = None,
+                 topological_order: Sequence[int] = None, root_ids: Sequence[int] = None):
+        # everything past the child edges can be derived from them - a snapshot hands it over precomputed
+        self.colors: Sequence[str] = colors
+        if sorted_ids is None:
+            # IDs sorted by their colors - a dict of a million colors alone would take more than all of the edges
+            sorted_ids = array('i', sorted(range(len(colors)), key=colors.__getitem__))
+        self._sorted_ids: Sequence[int] = sorted_ids
+        self.child_offsets: Sequence[int] = child_offsets
+        self.child_targets: Sequence[int] = child_targets
+        self.child_weights: Sequence[int] = child_weights
+        if parent_offsets is None or parent_targets is None:
+            parent_offsets, parent_targets = _transpose(len(colors), child_offsets, child_targets)
+        self.parent_offsets: Sequence[int] = parent_offsets
+        self.parent_targets: Sequence[int] = parent_targets
+        self._topological_order: Sequence[int] or None = topological_order
+        self._root_ids: Sequence[int] or None = root_ids
+        self._bag_counts: Dict[int, int] = dict()
+
+    @staticmethod
+    def from_rules(rules: Iterable[Tuple[str, List[Tuple[int, str]]]]) -> 'CompactGraph':
+        colors: List[str] = []
+        ids: Dict[str, int] = dict()
+
+        def intern(color: str) -> int:
+            color_id = ids.get(color)
+            if color_id is None:
+                color_id = len(colors)
+                ids[color] = color_id
+                colors.append(color)
+            return color_id
+
+        # collect the edges in the order of the rules first...
+        sources, targets, weights = array('i'), array('i'), array('i')
+        for node_color, children in rules:
+            node_id = intern(node_color)
+            for occurrences, child_color in children:
+                sources.append(node_id)
+                targets.append(intern(child_color))
+                weights.append(occurrences)
+        # ... then sort them by source, keeping the order of the rules within each node
+        offsets, order = _counting_sort(len(colors), sources)
+        child_targets = array('i', (targets[i] for i in order))
+        child_weights = array('i', (weights[i] for i in order))
+        _drop_duplicate_edges(len(colors), offsets, child_targets, child_weights)
+        return CompactGraph(colors, offsets, child_targets, child_weights)
+
+    def id_of(self, node_color: str) -> int:
+        i = bisect_left(self._sorted_ids, node_color, key=self.colors.__getitem__)
+        if i == len(self._sorted_ids) or self.colors[self._sorted_ids[i]] != node_color:
+            raise KeyError(node_color)
+        return self._sorted_ids[i]
+
+    @property
+    def root_colors(self) -> List[str]:
+        if self._root_ids is None:
+            # a root can't be anybody's child, so it's interned by its own rule - the ID order is the order of the rules
+            self._root_ids = array('i', (i for i in range(len(self.colors))
+                                         if self.parent_offsets[i] == self.parent_offsets[i + 1]))
+        return [self.colors[i] for i in self._root_ids]
+
+    @property
+    def topological_order(self) -> Sequence[int]:
+        # all the node IDs, every node after all of its children
+        if self._topological_order is None:
+            done: Set[int] = set()
+            order = array('i')
+            for node_id in self._walk(range(len(self.colors)), self.child_offsets, self.child_targets, done):
+                done.add(node_id)
+                order.append(node_id)
+            self._topological_order = order
+        return self._topological_order
+
+    def save_snapshot(self, snapshot_path: str, source_hash: bytes) -> None:
+        encoded = [color.encode() for color in self.colors]
+        color_offsets = array('i', [0])
+        for color in encoded:
+            color_offsets.append(color_offsets[-1] + len(color))
+        # force the lazily computed parts, so that a reload doesn't have to
+        self.root_colors
+        root_ids = self._root_ids
+        try:
+            order = self.topological_order
+        except ValueError:
+            # a loop in the rules - there's no order to store, the queries walk the graph and report the loop
+            # only when they run into it
+            order = array('i')
+        sections = [color_offsets, self._sorted_ids, self.child_offsets, self.child_targets, self.child_weights,
+                    self.parent_offsets, self.parent_targets, order, root_ids]
+        tmp_path = snapshot_path + ".tmp"
+        with open(tmp_path, 'wb') as snapshot_file:
+            snapshot_file.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, source_hash, len(self.colors),
+                                                     len(self.child_targets), len(root_ids), len(order),
+                                                     color_offsets[-1]))
+            for section in sections:
+                snapshot_file.write(section)
+            for color in encoded:
+                snapshot_file.write(color)
+        os.replace(tmp_path, snapshot_path)
+
+    @staticmethod
+    def load_snapshot(snapshot_path: str, source_hash: bytes) -> 'CompactGraph' or None:
+        # Maps the snapshot instead of reading it - the arrays are views of the mapping and the colors only get decoded
+        # when asked for
+        if not os.path.exists(snapshot_path):
+            return None
+        with open(snapshot_path, 'rb') as snapshot_file:
+            header = snapshot_file.read(SNAPSHOT_HEADER.size)
+            if len(header) != SNAPSHOT_HEADER.size:
+                return None
+            magic, snapshot_hash, nodes, edges, roots, ordered, color_bytes = SNAPSHOT_HEADER.unpack(header)
+            if magic != SNAPSHOT_MAGIC or snapshot_hash != source_hash or ordered not in (0, nodes):
+                return None
+            lengths = (nodes + 1, nodes, nodes + 1, edges, edges, nodes + 1, edges, ordered, roots)
+            if os.fstat(snapshot_file.fileno()).st_size != SNAPSHOT_HEADER.size + 4 * sum(lengths) + color_bytes:
+                return None
+            mapped = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+        ints = memoryview(mapped)[SNAPSHOT_HEADER.size:len(mapped) - color_bytes].cast('i')
+        sections: List[memoryview] = []
+        start = 0
+        for length in lengths:
+            sections.append(ints[start:start + length])
+            start += length
+        color_offsets, sorted_ids, child_offsets, child_targets, child_weights, parent_offsets, parent_targets, \
+            topological_order, root_ids = sections
+        if ordered != nodes:
+            topological_order = None
+        colors = ColorTable(memoryview(mapped)[len(mapped) - color_bytes:], color_offsets)
+        return CompactGraph(colors, child_offsets, child_targets, child_weights, parent_offsets=parent_offsets,
+                            parent_targets=parent_targets, sorted_ids=sorted_ids, topological_order=topological_order,
+                            root_ids=root_ids)
+
+    def _walk(self, node_ids: Iterable[int], offsets: array, targets: array, done) -> Iterator[int]:
+        # Iterative depth-first walk yielding the nodes which aren't in done yet in post-order, e.g. each node after
+        # all of its successors - the caller is expected to put every yielded node into done
+        for node_id in node_ids:
+            if node_id in done:
+                continue
+            in_progress: Set[int] = {node_id}
+            stack = [(node_id, offsets[node_id])]
+            while stack:
+                current, i = stack[-1]
+                end = offsets[current + 1]
+                while i < end:
+                    successor = targets[i]
+                    i += 1
+                    if successor in done:
+                        continue
+                    if successor in in_progress:
+                        raise ValueError("You lead me into a loop, you bastard!!!")
+                    stack[-1] = (current, i)
+                    in_progress.add(successor)
+                    stack.append((successor, offsets[successor]))
+                    break
+                else:
+                    stack.pop()
+                    in_progress.discard(current)
+                    yield current
+
+    def count_all_parents_for(self, node_color: str) -> Set[str]:
+        node_id = self.id_of(node_color)
+        ancestors: Set[int] = set()
+        for ancestor in self._walk([node_id], self.parent_offsets, self.parent_targets, ancestors):
+            ancestors.add(ancestor)
+        ancestors.discard(node_id)
+        return {self.colors[i] for i in ancestors}
+
+    def count_needed_other_bags_for(self, node_color: str) -> int:
+        return self.count_needed_bags_for(node_color) - 1
+
+    def count_needed_bags_for(self, node_color: str) -> int:
+        node_id = self.id_of(node_color)
+        return self._count_bags([node_id])[node_id]
+
+    def _count_bags(self, node_ids: List[int], sweep: bool = False) -> Dict[int, int]:
+        # a sweep counts the bags of every node along the known topological order, otherwise only the nodes below
+        # node_ids get walked
+        offsets, targets, weights = self.child_offsets, self.child_targets, self.child_weights
+        counts = self._bag_counts
+        if sweep and self._topological_order is not None:
+            pending: Iterable[int] = (node_id for node_id in self._topological_order if node_id not in counts)
+        else:
+            pending = self._walk(node_ids, offsets, targets, counts)
+        for current in pending:
+            total = 1
+            for i in range(offsets[current], offsets[current + 1]):
+                total += weights[i] * counts[targets[i]]
+            counts[current] = total
+        return counts
+
+    def _parent_ids(self, node_id: int) -> Sequence[int]:
+        return self.parent_targets[self.parent_offsets[node_id]:self.parent_offsets[node_id + 1]]
+
+    def ancestors_many(self, node_colors: Iterable[str]) -> Dict[str, Set[str]]:
+        node_colors = list(node_colors)
+        node_ids = [self.id_of(node_color) for node_color in node_colors]
+        order: Iterable[int]
+        if self._topological_order is not None:
+            # children come before their parents already - no walk needed, nodes without any bits are skipped
+            order = self._topological_order
+        else:
+            visited: Set[int] = set()
+            walked: List[int] = []
+            for node_id in self._walk(node_ids, self.parent_offsets, self.parent_targets, visited):
+                visited.add(node_id)
+                walked.append(node_id)
+            order = reversed(walked)
+        ancestors = _sweep_ancestors(node_ids, order, self._parent_ids, label=self.colors.__getitem__)
+        return dict(zip(node_colors, ancestors))
+
+    def descendant_counts_many(self, node_colors: Iterable[str]) -> Dict[str, int]:
+        node_colors = list(node_colors)
+        node_ids = [self.id_of(node_color) for node_color in node_colors]
+        counts = self._count_bags(node_ids, sweep=True)
+        return {node_color: counts[node_id] - 1 for node_color, node_id in zip(node_colors, node_ids)}
+
+
+class ColorTable(Sequence[str]):
+    # colors of a mapped snapshot - the UTF-8 encoded colors one after another and the offsets where each of them starts
+
+    def __init__(self, encoded: memoryview, offsets: Sequence[int]):
+        self.encoded = encoded
+        self.offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return str(self.encoded[self.offsets[i]:self.offsets[i + 1]], 'utf-8')
+
+
+def _sweep_ancestors(nodes: List, order: Iterable, parents_of: Callable[[object], Iterable],
+                     label: Callable[[object], str] = None) -> List[Set[str]]:
+    # Every queried node gets a bit. The order has to list each node before all of its parents, so the bits of a node
+    # are complete by the time they're pushed up to its parents - inherited[n] ends up with the bits of all queries
+    # below n. Costs a single pass over the ancestors however many queries share them.
+    own: Dict[object, int] = dict()
+    for bit, node in enumerate(nodes):
+        own[node] = own.get(node, 0) | (1 << bit)
+    inherited: Dict[object, int] = dict()
+    for node in order:
+        mask = inherited.get(node, 0) | own.get(node, 0)
+        if mask:
+            for parent in parents_of(node):
+                inherited[parent] = inherited.get(parent, 0) | mask
+
+    ancestors: List[Set[str]] = [set() for _ in nodes]
+    for node, mask in inherited.items():
+        name = node if label is None else label(node)
+        while mask:
+            lowest = mask & -mask
+            ancestors[lowest.bit_length() - 1].add(name)
+            mask ^= lowest
+    return ancestors
+
+
+def _counting_sort(size: int, keys: array) -> Tuple[array, array]:
+    # returns the CSR offsets of the keys and a stable order of the indexes sorted by key
+    offsets = array('i', bytes(4 * (size + 1)))
+    for key in keys:
+        offsets[key + 1] += 1
+    for i in range(size):
+        offsets[i + 1] += offsets[i]
+    cursors = offsets[:-1]
+    order = array('i', bytes(4 * len(keys)))
+    for i, key in enumerate(keys):
+        order[cursors[key]] = i
+        cursors[key] += 1
+    return offsets, order
+
+
+def _drop_duplicate_edges(size: int, offsets: array, targets: array, weights: array) -> None:
+    # A node with multiple rules keeps a single edge per child - on its first position, with the last occurrences,
+    # the same way Graph.add_node overwrites the child in the dict. Compacts the arrays in place.
+    last_row = array('i', [-1]) * size
+    position = array('i', bytes(4 * size))
+    write = 0
+    for node_id in range(size):
+        start, end = offsets[node_id], offsets[node_id + 1]
+        offsets[node_id] = write
+        for i in range(start, end):
+            target = targets[i]
+            if last_row[target] == node_id:
+                weights[position[target]] = weights[i]
+                continue
+            last_row[target] = node_id
+            position[target] = write
+            targets[write] = target
+            weights[write] = weights[i]
+            write += 1
+    offsets[size] = write
+    del targets[write:]
+    del weights[write:]
+
+
+def _transpose(size: int, offsets: array, targets: array) -> Tuple[array, array]:
+    sources = array('i', bytes(4 * len(targets)))
+    for node_id in range(size):
+        for i in range(offsets[node_id], offsets[node_id + 1]):
+            sources[i] = node_id
+    parent_offsets, order = _counting_sort(size, targets)
+    return parent_offsets, array('i', (sources[i] for i in order))
+
+
+def parse_rules(input_path: str) -> Iterator[Tuple[str, List[Tuple[int, str]]]]:
     with open(input_path, 'r') as input_file:
         for raw_line in input_file:
             line = raw_line.strip().lower()
@@ -140,18 +504,46 @@ def load(input_path: str) -> Graph or None:
                         occurrences = int(child_tuple[0].strip())
                         child_color = child_tuple[1].strip()
                         children.append((occurrences, child_color))
-                graph.add_node(bag_color, children)
+                yield bag_color, children
+
+
+def load(input_path: str) -> Graph or None:
+    return Graph.from_rules(parse_rules(input_path))
+
+
+def _source_hash(input_path: str) -> bytes:
+    digest = hashlib.sha256()
+    with open(input_path, 'rb') as input_file:
+        for chunk in iter(lambda: input_file.read(HASH_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.digest()
+
+
+def load_compact(input_path: str, use_snapshot: bool = True) -> CompactGraph:
+    if not use_snapshot:
+        return CompactGraph.from_rules(parse_rules(input_path))
+    snapshot_path = input_path + SNAPSHOT_SUFFIX
+    source_hash = _source_hash(input_path)
+    graph = CompactGraph.load_snapshot(snapshot_path, source_hash)
+    if graph is None:
+        graph = CompactGraph.from_rules(parse_rules(input_path))
+        graph.save_snapshot(snapshot_path, source_hash)
     return graph
 
 
-def main() -> None:
-    graph = load("./input.txt")
-    my_bag = "shiny gold"
-    n = graph.count_all_parents_for(my_bag)
-    print("%s bag can be contained by %d bags" % (my_bag, len(n)))
+def main(argv: List[str] or None = None) -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input", default="./input.txt", help="the bag rules, one rule per line")
+    parser.add_argument("--bags", nargs="+", default=["shiny gold"], help="answer both questions for these bags")
+    parser.add_argument("--compact", action="store_true", help="keep the graph in the compact CSR form")
+    args = parser.parse_args(argv)
 
-    n = graph.count_needed_other_bags_for(my_bag)
-    print("You need %d other bags if you start with a single %s bag" % (n, my_bag))
+    graph = load_compact(args.input) if args.compact else load(args.input)
+    ancestors = graph.ancestors_many(args.bags)
+    descendant_counts = graph.descendant_counts_many(args.bags)
+    for my_bag in args.bags:
+        print("%s bag can be contained by %d bags" % (my_bag, len(ancestors[my_bag])))
+        print("You need %d other bags if you start with a single %s bag" % (descendant_counts[my_bag], my_bag))
 
 
 if __name__ == "__main__":